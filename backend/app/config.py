@@ -40,6 +40,9 @@ class Settings(BaseSettings):
     ALLOWED_TABLES: list[str] = os.getenv("ALLOWED_TABLES", "").split(",") if os.getenv("ALLOWED_TABLES") else []
     MAX_QUERY_ROWS: int = int(os.getenv("MAX_QUERY_ROWS", "1000"))
     
+    # Cache Configuration
+    TEMPLATE_CACHE_MAXSIZE: int = int(os.getenv("TEMPLATE_CACHE_MAXSIZE", "2000"))
+    
     # Export Configuration
     PDF_EXPORT_ENABLED: bool = os.getenv("PDF_EXPORT_ENABLED", "True").lower() == "true"
     
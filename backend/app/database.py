@@ -1,6 +1,8 @@
 """
 Database connection and session management for MSSQL Server.
 """
+import os
+import re
 import pyodbc
 from typing import Optional
 from contextlib import contextmanager
@@ -9,6 +11,10 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Values of Database._current_db_context
+AUTH_DB_CONTEXT = "auth"
+COMPANY_DB_CONTEXT = "company"
+
 
 class Database:
     """Database connection manager."""
@@ -16,12 +22,10 @@ class Database:
     def __init__(self):
         self._auth_connection_string = self._build_connection_string()
         self.connection_string = self._auth_connection_string
-        self._current_db_context = "auth"
+        self._current_db_context = AUTH_DB_CONTEXT
     
     def _build_connection_string(self) -> str:
         """Build MSSQL connection string from settings."""
-        import os
-        
         # SSL/TLS configuration (can be overridden via environment variables)
         # For ODBC Driver 18 with TLS-enforced SQL Server, encryption is required
         # Default to True for ODBC Driver 18, but can be overridden via DB_ENCRYPT
@@ -61,7 +65,7 @@ class Database:
     def switch_to_auth_db(self) -> None:
         """Revert the active connection string back to the configured auth DB."""
         self.connection_string = self._auth_connection_string
-        self._current_db_context = "auth"
+        self._current_db_context = AUTH_DB_CONTEXT
 
     def switch_to_company_db(self, company_db_details: dict) -> None:
         """
@@ -79,7 +83,6 @@ class Database:
             raise ValueError("Missing company DBserver/DBname")
 
         # Always use SQL auth for company DB (details come from CompanyProfile)
-        import os
         # For ODBC Driver 18 with TLS-enforced SQL Server, encryption is required
         encrypt = os.getenv("DB_ENCRYPT", "True").lower() == "true"
         trust_cert = os.getenv("DB_TRUST_SERVER_CERTIFICATE", "True").lower() == "true"
@@ -115,7 +118,7 @@ class Database:
                 test_conn.close()
 
         self.connection_string = conn_str
-        self._current_db_context = "company"
+        self._current_db_context = COMPANY_DB_CONTEXT
     
     @contextmanager
     def get_connection(self):
@@ -150,8 +153,6 @@ class Database:
         with self.get_connection() as conn:
             cursor = conn.cursor()
             try:
-                import re
-                
                 # Extract all parameter names from query (including duplicates)
                 param_pattern = r'@(\w+)'
                 all_param_matches = list(re.finditer(param_pattern, query, re.IGNORECASE))
@@ -211,7 +212,6 @@ class Database:
         with self.get_connection() as conn:
             cursor = conn.cursor()
             try:
-                import re
                 param_pattern = r'@(\w+)'
                 
                 # Extract all parameter matches
@@ -248,6 +248,62 @@ class Database:
                 return result[0] if result else None
             finally:
                 cursor.close()
+    
+    def execute_non_query(self, query: str, params: Optional[dict] = None) -> int:
+        """
+        Execute a statement that returns no rows (DDL, INSERT/UPDATE/DELETE).
+        
+        Args:
+            query: SQL statement or batch with parameter placeholders (@ParamName)
+            params: Dictionary of parameter values
+            
+        Returns:
+            Number of rows affected (-1 when not applicable, e.g. DDL)
+        
+        Placeholders are only bound when params are given, so parameterless
+        batches may DECLARE and use their own T-SQL @variables.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                param_pattern = r'@(\w+)'
+                
+                # Extract all parameter matches
+                all_param_matches = list(re.finditer(param_pattern, query, re.IGNORECASE)) if params else []
+                
+                if not all_param_matches:
+                    # No parameters, execute directly
+                    cursor.execute(query)
+                else:
+                    # Get unique parameter names for validation
+                    param_names = list(set(match.group(1) for match in all_param_matches))
+                    
+                    # Validate all required parameters are provided
+                    missing_params = [p for p in param_names if p not in params]
+                    if missing_params:
+                        raise ValueError(f"Missing required parameters: {', '.join(missing_params)}")
+                    
+                    # Build parameterized query and values list
+                    formatted_query = query
+                    param_values = []
+                    
+                    # Process matches in reverse order to preserve positions
+                    for match in reversed(all_param_matches):
+                        param_name = match.group(1)
+                        start, end = match.span()
+                        formatted_query = formatted_query[:start] + '?' + formatted_query[end:]
+                        param_values.insert(0, params[param_name])
+                    
+                    cursor.execute(formatted_query, param_values)
+                
+                row_count = cursor.rowcount
+                # Step through the rest of a multi-statement batch: pyodbc only
+                # raises a later statement's error once its result is reached
+                while cursor.nextset():
+                    pass
+                return row_count
+            finally:
+                cursor.close()
 
 
 # Global database instance
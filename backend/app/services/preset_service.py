@@ -7,10 +7,16 @@ from typing import List, Optional
 from app.database import db
 from app.models.preset import PresetCreate, PresetUpdate, PresetResponse
 from app.utils.sql_validator import validator, SQLValidationError
-import logging
 
-logger = logging.getLogger(__name__)
 
+# Explicit column list, in _row_to_preset_response order (see the note on
+# _TEMPLATE_COLUMNS in template_service)
+_PRESET_COLUMNS = (
+    "PresetId", "PresetName", "SqlJson", "ExpectedParams",
+    "CreatedBy", "CreatedOn", "UpdatedOn", "IsActive",
+)
+_SELECT_COLUMNS = ", ".join(_PRESET_COLUMNS)
+_OUTPUT_COLUMNS = ", ".join(f"INSERTED.{c}" for c in _PRESET_COLUMNS)
 
 class PresetService:
     """Service for SQL preset management."""
@@ -36,21 +42,30 @@ class PresetService:
         if not validation_result['valid']:
             raise SQLValidationError("SQL validation failed")
         
-        # Check if preset name already exists
-        existing = self.get_preset_by_name(preset_data.presetName)
-        if existing:
-            raise ValueError(f"Preset with name '{preset_data.presetName}' already exists")
+        # UPDLOCK/HOLDLOCK keeps the checked name range locked until the insert
+        # commits, so a concurrent create can't slip the same name in
+        exists_query = """
+            SELECT 1 FROM ReportSqlPresets WITH (UPDLOCK, HOLDLOCK)
+            WHERE PresetName = ? AND IsActive = 1
+        """
         
         # Insert into database
-        insert_query = """
+        insert_query = f"""
             INSERT INTO ReportSqlPresets (PresetName, SqlJson, ExpectedParams, CreatedBy)
-            OUTPUT INSERTED.*
+            OUTPUT {_OUTPUT_COLUMNS}
             VALUES (?, ?, ?, ?)
         """
         
+        # Name check and insert run in one transaction (get_connection turns
+        # autocommit off and rolls back on error)
         with db.get_connection() as conn:
             cursor = conn.cursor()
             try:
+                # Check if preset name already exists
+                cursor.execute(exists_query, (preset_data.presetName,))
+                if cursor.fetchone():
+                    raise ValueError(f"Preset with name '{preset_data.presetName}' already exists")
+                
                 cursor.execute(
                     insert_query,
                     (
@@ -80,7 +95,7 @@ class PresetService:
         Returns:
             Preset or None if not found
         """
-        query = "SELECT * FROM ReportSqlPresets WHERE PresetId = ? AND IsActive = 1"
+        query = f"SELECT {_SELECT_COLUMNS} FROM ReportSqlPresets WHERE PresetId = ? AND IsActive = 1"
         
         with db.get_connection() as conn:
             cursor = conn.cursor()
@@ -104,7 +119,7 @@ class PresetService:
         Returns:
             Preset or None if not found
         """
-        query = "SELECT * FROM ReportSqlPresets WHERE PresetName = ? AND IsActive = 1"
+        query = f"SELECT {_SELECT_COLUMNS} FROM ReportSqlPresets WHERE PresetName = ? AND IsActive = 1"
         
         with db.get_connection() as conn:
             cursor = conn.cursor()
@@ -130,8 +145,8 @@ class PresetService:
             Tuple of (presets list, total count)
         """
         count_query = "SELECT COUNT(*) FROM ReportSqlPresets WHERE IsActive = 1"
-        list_query = """
-            SELECT * FROM ReportSqlPresets 
+        list_query = f"""
+            SELECT {_SELECT_COLUMNS} FROM ReportSqlPresets 
             WHERE IsActive = 1 
             ORDER BY CreatedOn DESC
             OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
@@ -146,9 +161,7 @@ class PresetService:
                 
                 # Get presets
                 cursor.execute(list_query, (skip, limit))
-                rows = cursor.fetchall()
-                
-                presets = [self._row_to_preset_response(row) for row in rows]
+                presets = [self._row_to_preset_response(row) for row in cursor]
                 return presets, total
             finally:
                 cursor.close()
@@ -205,7 +218,7 @@ class PresetService:
         update_query = f"""
             UPDATE ReportSqlPresets 
             SET {', '.join(updates)}
-            OUTPUT INSERTED.*
+            OUTPUT {_OUTPUT_COLUMNS}
             WHERE PresetId = ? AND IsActive = 1
         """
         
@@ -248,16 +261,16 @@ class PresetService:
                 cursor.close()
     
     def _row_to_preset_response(self, row) -> PresetResponse:
-        """Convert database row to PresetResponse."""
-        return PresetResponse(
+        """Convert database row to PresetResponse (trusted DB data, no re-validation)."""
+        return PresetResponse.model_construct(
             PresetId=row[0],
             PresetName=row[1],
             SqlJson=row[2],
             ExpectedParams=row[3],
             CreatedBy=row[4],
             CreatedOn=row[5],
-            UpdatedOn=row[6] if len(row) > 6 else None,
-            IsActive=bool(row[7] if len(row) > 7 else True)
+            UpdatedOn=row[6],
+            IsActive=bool(row[7])
         )
 
 
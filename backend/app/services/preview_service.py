@@ -2,12 +2,13 @@
 Service for generating bill previews.
 Executes SQL presets and prepares data for template rendering.
 """
-import json
+import re
 from typing import Dict, List, Optional, Any
 from app.database import db
 from app.services.preset_service import preset_service
 from app.services.template_service import template_service
 from app.config import settings
+from app.utils.cache import cached_json_loads
 import logging
 
 logger = logging.getLogger(__name__)
@@ -45,8 +46,8 @@ class PreviewService:
         if not preset:
             raise ValueError(f"Preset with ID {template.PresetId} not found")
         
-        # Parse SQL JSON
-        sql_json = json.loads(preset.SqlJson)
+        # Parse SQL JSON (cached per SqlJson text; read-only below)
+        sql_json = cached_json_loads(preset.SqlJson)
         
         # Validate required parameters
         required_params = self._extract_required_parameters(sql_json)
@@ -118,7 +119,6 @@ class PreviewService:
         Returns:
             List of required parameter names
         """
-        import re
         param_pattern = r'@(\w+)'
         all_params = []
         
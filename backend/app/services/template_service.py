@@ -3,16 +3,93 @@ Service for managing Templates.
 Handles CRUD operations for bill templates.
 """
 from typing import List, Optional
+import pyodbc
 from app.database import db
 from app.models.template import TemplateCreate, TemplateUpdate, TemplateResponse
-import logging
+from app.utils.cache import template_cache, make_cache_key
 
-logger = logging.getLogger(__name__)
+
+# Explicit column list, in _row_to_template_response order. SELECT * would
+# follow the physical column order, which differs on older tables that
+# ensure_company_schema patched with ALTER TABLE ... ADD.
+_TEMPLATE_COLUMNS = (
+    "TemplateId", "PresetId", "TemplateName", "TemplateJson",
+    "CreatedBy", "CreatedOn", "UpdatedOn", "IsActive",
+)
+_SELECT_COLUMNS = ", ".join(_TEMPLATE_COLUMNS)
+_OUTPUT_COLUMNS = ", ".join(f"INSERTED.{c}" for c in _TEMPLATE_COLUMNS)
+
+# Cached in place of a template/ID to remember that a lookup found nothing
+_MISSING = object()
+
+# FK on ReportTemplates.PresetId (see app.utils.company_schema)
+_PRESET_FK_NAME = "FK_ReportTemplates_ReportSqlPresets"
+
+
+def _is_preset_fk_violation(error: pyodbc.IntegrityError) -> bool:
+    """
+    Whether an IntegrityError is the PresetId foreign key violation.
+    
+    SQL Server reports it as error 547 with the constraint name in the
+    message; other integrity errors (unique, CHECK, NOT NULL) don't match.
+    """
+    return any(_PRESET_FK_NAME in str(arg) for arg in error.args)
 
 
 class TemplateService:
     """Service for template management."""
     
+    # Misses are cached briefly; creates overwrite them with the new row
+    _NEGATIVE_TTL = 30
+    
+    # Fixed statement texts, built once at import so every call sends
+    # byte-identical SQL (driver and server plan caches can reuse them)
+    
+    # Preset check, duplicate-name check and insert in one statement: no row
+    # is inserted for a missing/inactive preset or an existing name, and the
+    # FK on PresetId backs it up against concurrent hard deletes.
+    # UPDLOCK/HOLDLOCK keeps the checked name range locked until commit so a
+    # concurrent create can't slip the same name in.
+    _SQL_INSERT = f"""
+        INSERT INTO ReportTemplates (PresetId, TemplateName, TemplateJson, CreatedBy)
+        OUTPUT {_OUTPUT_COLUMNS}
+        SELECT ?, ?, ?, ?
+        WHERE EXISTS (SELECT 1 FROM ReportSqlPresets WHERE PresetId = ? AND IsActive = 1)
+          AND NOT EXISTS (
+              SELECT 1 FROM ReportTemplates WITH (UPDLOCK, HOLDLOCK)
+              WHERE TemplateName = ? AND PresetId = ? AND IsActive = 1
+          )
+    """
+    _SQL_PRESET_ACTIVE = "SELECT 1 FROM ReportSqlPresets WHERE PresetId = ? AND IsActive = 1"
+    _SQL_GET_BY_ID = f"SELECT {_SELECT_COLUMNS} FROM ReportTemplates WHERE TemplateId = ? AND IsActive = 1"
+    _SQL_GET_BY_NAME = f"SELECT {_SELECT_COLUMNS} FROM ReportTemplates WHERE TemplateName = ? AND IsActive = 1"
+    _SQL_GET_BY_NAME_AND_PRESET = (
+        f"SELECT {_SELECT_COLUMNS} FROM ReportTemplates WHERE TemplateName = ? AND PresetId = ? AND IsActive = 1"
+    )
+    
+    # Page queries also return the total via COUNT(*) OVER() (computed before
+    # OFFSET/FETCH), so the common case is a single round trip
+    _SQL_COUNT = "SELECT COUNT(*) FROM ReportTemplates WHERE IsActive = 1"
+    _SQL_LIST = f"""
+        SELECT COUNT(*) OVER() AS TotalCount, {_SELECT_COLUMNS} FROM ReportTemplates 
+        WHERE IsActive = 1 
+        ORDER BY CreatedOn DESC
+        OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
+    """
+    _SQL_COUNT_BY_PRESET = "SELECT COUNT(*) FROM ReportTemplates WHERE PresetId = ? AND IsActive = 1"
+    _SQL_LIST_BY_PRESET = f"""
+        SELECT COUNT(*) OVER() AS TotalCount, {_SELECT_COLUMNS} FROM ReportTemplates 
+        WHERE PresetId = ? AND IsActive = 1 
+        ORDER BY CreatedOn DESC
+        OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
+    """
+    
+    _SQL_SOFT_DELETE = """
+        UPDATE ReportTemplates 
+        SET IsActive = 0, UpdatedOn = GETDATE()
+        WHERE TemplateId = ? AND IsActive = 1
+    """
+    
     def create_template(self, template_data: TemplateCreate) -> TemplateResponse:
         """
         Create a new template.
@@ -26,43 +103,39 @@ class TemplateService:
         Raises:
             ValueError: If preset doesn't exist or template name already exists
         """
-        # Verify preset exists
-        from app.services.preset_service import preset_service
-        preset = preset_service.get_preset(template_data.presetId)
-        if not preset:
-            raise ValueError(f"Preset with ID {template_data.presetId} not found")
-        
-        # Check if template name already exists for this preset
-        existing = self.get_template_by_name(template_data.templateName, template_data.presetId)
-        if existing:
-            raise ValueError(f"Template with name '{template_data.templateName}' already exists for this preset")
-        
-        # Insert into database
-        insert_query = """
-            INSERT INTO ReportTemplates (PresetId, TemplateName, TemplateJson, CreatedBy)
-            OUTPUT INSERTED.*
-            VALUES (?, ?, ?, ?)
-        """
-        
         with db.get_connection() as conn:
             cursor = conn.cursor()
             try:
-                cursor.execute(
-                    insert_query,
-                    (
-                        template_data.presetId,
-                        template_data.templateName,
-                        template_data.templateJson,
-                        template_data.createdBy
+                try:
+                    cursor.execute(
+                        self._SQL_INSERT,
+                        (
+                            template_data.presetId,
+                            template_data.templateName,
+                            template_data.templateJson,
+                            template_data.createdBy,
+                            template_data.presetId,
+                            template_data.templateName,
+                            template_data.presetId
+                        )
                     )
-                )
+                except pyodbc.IntegrityError as e:
+                    if not _is_preset_fk_violation(e):
+                        raise
+                    raise ValueError(f"Preset with ID {template_data.presetId} not found") from e
                 row = cursor.fetchone()
-                conn.commit()
                 
                 if row:
-                    return self._row_to_template_response(row)
-                else:
-                    raise Exception("Failed to create template")
+                    conn.commit()
+                    template = self._row_to_template_response(row)
+                    self._cache_template(template)
+                    return template
+                
+                # Nothing inserted: work out which condition failed
+                cursor.execute(self._SQL_PRESET_ACTIVE, (template_data.presetId,))
+                if not cursor.fetchone():
+                    raise ValueError(f"Preset with ID {template_data.presetId} not found")
+                raise ValueError(f"Template with name '{template_data.templateName}' already exists for this preset")
             finally:
                 cursor.close()
     
@@ -76,19 +149,28 @@ class TemplateService:
         Returns:
             Template or None if not found
         """
-        query = "SELECT * FROM ReportTemplates WHERE TemplateId = ? AND IsActive = 1"
+        cache_key = self._cache_key("template", template_id)
         
-        with db.get_connection() as conn:
-            cursor = conn.cursor()
-            try:
-                cursor.execute(query, (template_id,))
-                row = cursor.fetchone()
-                
-                if row:
-                    return self._row_to_template_response(row)
-                return None
-            finally:
-                cursor.close()
+        def load() -> Optional[TemplateResponse]:
+            with db.get_connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute(self._SQL_GET_BY_ID, (template_id,))
+                    row = cursor.fetchone()
+                    
+                    if row:
+                        template = self._row_to_template_response(row)
+                        self._cache_template_names(template)
+                        return template
+                    # Not cached by get_or_set (None); store the short-lived miss here
+                    template_cache.set(cache_key, _MISSING, self._NEGATIVE_TTL)
+                    return None
+                finally:
+                    cursor.close()
+        
+        # Concurrent misses for the same ID share one query
+        cached = template_cache.get_or_set(cache_key, load)
+        return None if cached is _MISSING else cached
     
     def get_template_by_name(self, template_name: str, preset_id: Optional[int] = None) -> Optional[TemplateResponse]:
         """
@@ -101,11 +183,26 @@ class TemplateService:
         Returns:
             Template or None if not found
         """
+        # Name lookups cache only the TemplateId and resolve it through the ID
+        # cache, which is what writers invalidate. The resolved template is
+        # re-checked against the name so renamed/deleted rows fall through.
+        name_key = self._cache_key("template_name", preset_id or 0, template_name)
+        cached_id = template_cache.get(name_key)
+        if cached_id is _MISSING:
+            return None
+        if cached_id is not None:
+            template = self.get_template(cached_id)
+            if template and template.TemplateName == template_name and (
+                not preset_id or template.PresetId == preset_id
+            ):
+                return template
+            template_cache.delete(name_key)
+        
         if preset_id:
-            query = "SELECT * FROM ReportTemplates WHERE TemplateName = ? AND PresetId = ? AND IsActive = 1"
+            query = self._SQL_GET_BY_NAME_AND_PRESET
             params = (template_name, preset_id)
         else:
-            query = "SELECT * FROM ReportTemplates WHERE TemplateName = ? AND IsActive = 1"
+            query = self._SQL_GET_BY_NAME
             params = (template_name,)
         
         with db.get_connection() as conn:
@@ -115,7 +212,10 @@ class TemplateService:
                 row = cursor.fetchone()
                 
                 if row:
-                    return self._row_to_template_response(row)
+                    template = self._row_to_template_response(row)
+                    self._cache_template(template)
+                    return template
+                template_cache.set(name_key, _MISSING, self._NEGATIVE_TTL)
                 return None
             finally:
                 cursor.close()
@@ -133,38 +233,30 @@ class TemplateService:
             Tuple of (templates list, total count)
         """
         if preset_id:
-            count_query = "SELECT COUNT(*) FROM ReportTemplates WHERE PresetId = ? AND IsActive = 1"
-            list_query = """
-                SELECT * FROM ReportTemplates 
-                WHERE PresetId = ? AND IsActive = 1 
-                ORDER BY CreatedOn DESC
-                OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
-            """
+            count_query, list_query = self._SQL_COUNT_BY_PRESET, self._SQL_LIST_BY_PRESET
             count_params = (preset_id,)
             list_params = (preset_id, skip, limit)
         else:
-            count_query = "SELECT COUNT(*) FROM ReportTemplates WHERE IsActive = 1"
-            list_query = """
-                SELECT * FROM ReportTemplates 
-                WHERE IsActive = 1 
-                ORDER BY CreatedOn DESC
-                OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
-            """
+            count_query, list_query = self._SQL_COUNT, self._SQL_LIST
             count_params = ()
             list_params = (skip, limit)
         
         with db.get_connection() as conn:
             cursor = conn.cursor()
             try:
-                # Get total count
-                cursor.execute(count_query, count_params)
-                total = cursor.fetchone()[0]
-                
-                # Get templates
+                # Get templates (rows are converted as they are fetched)
                 cursor.execute(list_query, list_params)
-                rows = cursor.fetchall()
+                total = None
+                templates = []
+                for row in cursor:
+                    total = row[0]
+                    templates.append(self._row_to_template_response(row[1:]))
+                
+                # Empty page (no matches or skip past the end): count separately
+                if total is None:
+                    cursor.execute(count_query, count_params)
+                    total = cursor.fetchone()[0]
                 
-                templates = [self._row_to_template_response(row) for row in rows]
                 return templates, total
             finally:
                 cursor.close()
@@ -180,21 +272,32 @@ class TemplateService:
         Returns:
             Updated template or None if not found
         """
-        # Build update query dynamically
+        # Build update query dynamically. Save-all flows resend unchanged
+        # values, so the row is only written when a supplied field differs
+        # from what is stored (decided by the database, not a cached copy;
+        # binary collation so case-only renames still count as changes)
         updates = []
         params = []
+        changes = []
+        change_params = []
         
         if template_data.templateName is not None:
             updates.append("TemplateName = ?")
             params.append(template_data.templateName)
+            changes.append("TemplateName COLLATE Latin1_General_BIN2 <> ?")
+            change_params.append(template_data.templateName)
         
         if template_data.templateJson is not None:
             updates.append("TemplateJson = ?")
             params.append(template_data.templateJson)
+            changes.append("TemplateJson COLLATE Latin1_General_BIN2 <> ?")
+            change_params.append(template_data.templateJson)
         
         if template_data.isActive is not None:
             updates.append("IsActive = ?")
             params.append(template_data.isActive)
+            changes.append("IsActive <> ?")
+            change_params.append(template_data.isActive)
         
         if not updates:
             # No updates provided, just return existing
@@ -202,12 +305,14 @@ class TemplateService:
         
         updates.append("UpdatedOn = GETDATE()")
         params.append(template_id)
+        params.extend(change_params)
         
         update_query = f"""
             UPDATE ReportTemplates 
             SET {', '.join(updates)}
-            OUTPUT INSERTED.*
+            OUTPUT {_OUTPUT_COLUMNS}
             WHERE TemplateId = ? AND IsActive = 1
+              AND ({' OR '.join(changes)})
         """
         
         with db.get_connection() as conn:
@@ -218,10 +323,18 @@ class TemplateService:
                 conn.commit()
                 
                 if row:
-                    return self._row_to_template_response(row)
-                return None
+                    template = self._row_to_template_response(row)
+                    # Also drop the new name's keys: a rename can make a
+                    # previously missing name resolvable
+                    self._invalidate(template_id, template)
+                    return template
             finally:
                 cursor.close()
+        
+        # Nothing written: either the template is missing/inactive or nothing
+        # changed. Drop any cached copy and answer from a fresh read.
+        self._invalidate(template_id)
+        return self.get_template(template_id)
     
     def delete_template(self, template_id: int) -> bool:
         """
@@ -233,32 +346,67 @@ class TemplateService:
         Returns:
             True if deleted, False if not found
         """
-        update_query = """
-            UPDATE ReportTemplates 
-            SET IsActive = 0, UpdatedOn = GETDATE()
-            WHERE TemplateId = ? AND IsActive = 1
-        """
-        
         with db.get_connection() as conn:
             cursor = conn.cursor()
             try:
-                cursor.execute(update_query, (template_id,))
+                cursor.execute(self._SQL_SOFT_DELETE, (template_id,))
                 conn.commit()
+                self._invalidate(template_id)
                 return cursor.rowcount > 0
             finally:
                 cursor.close()
     
+    def _cache_key(self, prefix: str, *args) -> str:
+        """Cache key scoped to the active (auth or company) database."""
+        return make_cache_key(prefix, db.connection_string, *args)
+    
+    def _cache_template(self, template: TemplateResponse) -> None:
+        """Cache a template by ID plus its name -> ID mappings."""
+        template_cache.set_many(
+            [(self._cache_key("template", template.TemplateId), template)]
+            + self._template_name_entries(template)
+        )
+    
+    def _cache_template_names(self, template: TemplateResponse) -> None:
+        """Cache the name -> ID mappings for a template."""
+        template_cache.set_many(self._template_name_entries(template))
+    
+    def _template_name_entries(self, template: TemplateResponse) -> list:
+        """(name key, TemplateId) pairs for the preset-scoped and unscoped lookups."""
+        return [
+            (self._cache_key("template_name", preset_key, template.TemplateName), template.TemplateId)
+            for preset_key in (template.PresetId, 0)
+        ]
+    
+    def _invalidate(self, template_id: int, *templates: TemplateResponse) -> None:
+        """
+        Drop cached entries for a template after a write.
+        
+        Removes the ID key and the name keys of the cached (pre-write) template
+        plus any other versions passed in, e.g. the row returned by an update.
+        """
+        id_key = self._cache_key("template", template_id)
+        cached = template_cache.get(id_key)
+        template_cache.delete(id_key)
+        for template in (cached, *templates):
+            if template is None or template is _MISSING:
+                continue
+            for preset_key in (template.PresetId, 0):
+                template_cache.delete(
+                    self._cache_key("template_name", preset_key, template.TemplateName)
+                )
+    
     def _row_to_template_response(self, row) -> TemplateResponse:
-        """Convert database row to TemplateResponse."""
-        return TemplateResponse(
+        """Convert database row to TemplateResponse (trusted DB data, no re-validation)."""
+        return TemplateResponse.model_construct(
             TemplateId=row[0],
             PresetId=row[1],
             TemplateName=row[2],
             TemplateJson=row[3],
             CreatedBy=row[4],
             CreatedOn=row[5],
-            UpdatedOn=row[6] if len(row) > 6 else None,
-            IsActive=bool(row[7] if len(row) > 7 else True)
+            UpdatedOn=row[6],
+            IsActive=bool(row[7])
         )
 
 
@@ -0,0 +1,182 @@
+"""
+Small in-memory TTL cache for hot read paths (templates by ID, ...).
+
+NOTE:
+- Like the session store, this is process-local memory (not shared across
+  multiple workers/instances). Entries expire after their TTL, which bounds
+  how stale a value changed by another process can get.
+- Writers in this process are expected to delete the keys they affect.
+"""
+
+import functools
+import hashlib
+import heapq
+import json
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.config import settings
+
+_NS_PER_SECOND = 1_000_000_000
+
+
+class TTLCache:
+    """
+    Thread-safe key/value cache whose entries expire after a TTL (seconds).
+
+    Expiry times are time.monotonic_ns() integers, so wall-clock changes
+    don't expire (or resurrect) entries. With maxsize set, the least recently
+    used entry is evicted once the cache is full.
+    """
+
+    def __init__(self, default_ttl: int = 300, maxsize: Optional[int] = None):
+        self._default_ttl_ns = default_ttl * _NS_PER_SECOND
+        self._maxsize = maxsize
+        # Kept in LRU order: oldest first
+        self._cache: "OrderedDict[str, Tuple[Any, int]]" = OrderedDict()
+        # Min-heap of (expiry, key). Overwritten/deleted keys leave stale
+        # items behind; they are skipped when their expiry doesn't match.
+        self._expiry_heap: List[Tuple[int, str]] = []
+        self._lock = threading.Lock()
+        # Per-key locks held while a get_or_set producer runs
+        self._key_locks: Dict[str, threading.Lock] = {}
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value, or None if missing or expired."""
+        # Reads skip the lock: get/move_to_end are atomic under the GIL and
+        # entries are replaced whole, never mutated in place
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        value, expiry = entry
+        if time.monotonic_ns() > expiry:
+            with self._lock:
+                # Only drop the entry we saw; a concurrent set may have replaced it
+                if self._cache.get(key) is entry:
+                    del self._cache[key]
+            return None
+        try:
+            self._cache.move_to_end(key)
+        except KeyError:
+            # Deleted or evicted since we read it; the value is still valid
+            pass
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        """Store a value for ttl seconds (default_ttl when not given)."""
+        self.set_many(((key, value),), ttl)
+
+    def set_many(self, items: Iterable[Tuple[str, Any]], ttl: Optional[int] = None) -> None:
+        """Store several (key, value) pairs with one clock read and one lock."""
+        ttl_ns = self._default_ttl_ns if ttl is None else int(ttl * _NS_PER_SECOND)
+        now = time.monotonic_ns()
+        expiry = now + ttl_ns
+        with self._lock:
+            for key, value in items:
+                self._cache[key] = (value, expiry)
+                self._cache.move_to_end(key)
+                heapq.heappush(self._expiry_heap, (expiry, key))
+            # Amortized cleanup keeps both the dict and the heap bounded
+            self._purge_expired(now)
+            if self._maxsize is not None:
+                while len(self._cache) > self._maxsize:
+                    self._cache.popitem(last=False)
+
+    def get_or_set(self, key: str, producer: Callable[[], Any], ttl: Optional[int] = None) -> Any:
+        """
+        Return the cached value, computing and storing it on a miss.
+
+        Concurrent misses for the same key wait for a single producer call
+        instead of each running it. A None result is returned but not cached.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        try:
+            with key_lock:
+                # Another thread may have filled the key while we waited
+                value = self.get(key)
+                if value is None:
+                    value = producer()
+                    if value is not None:
+                        self.set(key, value, ttl)
+                return value
+        finally:
+            with self._lock:
+                if self._key_locks.get(key) is key_lock:
+                    del self._key_locks[key]
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._cache.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self._expiry_heap.clear()
+
+    def cleanup_expired(self) -> int:
+        """Drop every expired entry and return how many were removed."""
+        now = time.monotonic_ns()
+        with self._lock:
+            return self._purge_expired(now)
+
+    def _purge_expired(self, now: int) -> int:
+        """Pop expired heap items and their live entries (caller holds the lock)."""
+        heap = self._expiry_heap
+        removed = 0
+        while heap and heap[0][0] < now:
+            expiry, key = heapq.heappop(heap)
+            entry = self._cache.get(key)
+            if entry is not None and entry[1] == expiry:
+                del self._cache[key]
+                removed += 1
+        return removed
+
+
+def make_cache_key(prefix: str, *args: Any, **kwargs: Any) -> str:
+    """
+    Build a deterministic cache key from a prefix and call arguments.
+
+    The arguments (and sorted kwargs) are pickled and hashed with a 128-bit
+    BLAKE2b digest, so every key has the same short length however large the
+    arguments are (e.g. ones that include a connection string).
+
+    Keys for hashable arguments are memoized, since the same few IDs are
+    looked up over and over.
+    """
+    kwargs_items = tuple(sorted(kwargs.items())) if kwargs else ()
+    # Argument types are part of the memo key: 1, 1.0 and True compare equal
+    # but pickle (and so hash) differently
+    arg_types = tuple(type(arg) for arg in args) + tuple(type(v) for _, v in kwargs_items)
+    try:
+        return _memoized_cache_key(prefix, args, kwargs_items, arg_types)
+    except TypeError:
+        # Unhashable arguments (lists, dicts): build the key directly
+        return _build_cache_key(prefix, args, kwargs_items)
+
+
+def _build_cache_key(prefix: str, args: tuple, kwargs_items: tuple) -> str:
+    payload = pickle.dumps((args, kwargs_items), protocol=pickle.HIGHEST_PROTOCOL)
+    return f"{prefix}:{hashlib.blake2b(payload, digest_size=16).hexdigest()}"
+
+
+@functools.lru_cache(maxsize=4096)
+def _memoized_cache_key(prefix: str, args: tuple, kwargs_items: tuple, arg_types: tuple) -> str:
+    return _build_cache_key(prefix, args, kwargs_items)
+
+
+@functools.lru_cache(maxsize=256)
+def cached_json_loads(text: str) -> Any:
+    """json.loads memoized by text; the result is shared, so callers must not mutate it."""
+    return json.loads(text)
+
+
+# Global cache instances
+template_cache = TTLCache(default_ttl=300, maxsize=settings.TEMPLATE_CACHE_MAXSIZE)
@@ -2,183 +2,250 @@
 Ensure required tables exist in the *company database*.
 
 We keep this idempotent: safe to run repeatedly.
-Matches backend/migrations/001_initial_schema.sql tables/indexes.
+Matches the tables/indexes created by backend/migrations/*.sql.
+
+The schema is described as data below (tables, indexes, foreign keys). One
+catalog query snapshots what the database already has, and only the DDL for
+missing objects is generated and sent, as a single batch.
 """
 
-from app.database import db
+import threading
+import time
+from typing import List, NamedTuple, Optional, Set, Tuple
 
+from app.database import db, AUTH_DB_CONTEXT
 
-def ensure_company_schema() -> None:
-    # If objects exist but are missing columns (older schema), patch them.
-    # We use COL_LENGTH checks to avoid failing on CREATE INDEX / FK.
-
-    # Create ReportSqlPresets if missing
-    db.execute_non_query(
-        """
-        IF OBJECT_ID('dbo.ReportSqlPresets', 'U') IS NULL
-        BEGIN
-            CREATE TABLE dbo.ReportSqlPresets (
-                PresetId INT IDENTITY(1,1) PRIMARY KEY,
-                PresetName VARCHAR(100) NOT NULL,
-                SqlJson NVARCHAR(MAX) NOT NULL,
-                ExpectedParams NVARCHAR(500) NULL,
-                CreatedBy VARCHAR(50) NULL,
-                CreatedOn DATETIME DEFAULT GETDATE(),
-                UpdatedOn DATETIME NULL,
-                IsActive BIT DEFAULT 1
-            );
-        END
-        """
-    )
 
-    # Patch missing columns in dbo.ReportSqlPresets (if table exists but schema differs)
-    db.execute_non_query(
-        """
-        IF OBJECT_ID('dbo.ReportSqlPresets', 'U') IS NOT NULL
-        BEGIN
-            IF COL_LENGTH('dbo.ReportSqlPresets','PresetId') IS NULL
-                ALTER TABLE dbo.ReportSqlPresets ADD PresetId INT IDENTITY(1,1) NOT NULL;
-            IF COL_LENGTH('dbo.ReportSqlPresets','PresetName') IS NULL
-                ALTER TABLE dbo.ReportSqlPresets ADD PresetName VARCHAR(100) NULL;
-            IF COL_LENGTH('dbo.ReportSqlPresets','SqlJson') IS NULL
-                ALTER TABLE dbo.ReportSqlPresets ADD SqlJson NVARCHAR(MAX) NULL;
-            IF COL_LENGTH('dbo.ReportSqlPresets','ExpectedParams') IS NULL
-                ALTER TABLE dbo.ReportSqlPresets ADD ExpectedParams NVARCHAR(500) NULL;
-            IF COL_LENGTH('dbo.ReportSqlPresets','CreatedBy') IS NULL
-                ALTER TABLE dbo.ReportSqlPresets ADD CreatedBy VARCHAR(50) NULL;
-            IF COL_LENGTH('dbo.ReportSqlPresets','CreatedOn') IS NULL
-                ALTER TABLE dbo.ReportSqlPresets ADD CreatedOn DATETIME NULL;
-            IF COL_LENGTH('dbo.ReportSqlPresets','UpdatedOn') IS NULL
-                ALTER TABLE dbo.ReportSqlPresets ADD UpdatedOn DATETIME NULL;
-            IF COL_LENGTH('dbo.ReportSqlPresets','IsActive') IS NULL
-                ALTER TABLE dbo.ReportSqlPresets ADD IsActive BIT NULL;
-        END
-        """
-    )
+# Databases (keyed by connection string) -> time.monotonic() of the last
+# successful ensure in this process. The schema rarely changes while we run,
+# so the catalog is only re-checked after _REVALIDATE_SECONDS (to pick up
+# out-of-band changes such as a restored backup).
+_ensured_databases: dict[str, float] = {}
+_ensured_lock = threading.Lock()
+_REVALIDATE_SECONDS = 3600
 
-    # Create indexes if missing
-    db.execute_non_query(
-        """
-        IF OBJECT_ID('dbo.ReportSqlPresets', 'U') IS NOT NULL
-           AND COL_LENGTH('dbo.ReportSqlPresets','PresetName') IS NOT NULL
-           AND NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_ReportSqlPresets_PresetName' AND object_id = OBJECT_ID('dbo.ReportSqlPresets'))
-        BEGIN
-            CREATE INDEX IX_ReportSqlPresets_PresetName ON dbo.ReportSqlPresets(PresetName);
-        END
-        """
-    )
-    db.execute_non_query(
-        """
-        IF OBJECT_ID('dbo.ReportSqlPresets', 'U') IS NOT NULL
-           AND COL_LENGTH('dbo.ReportSqlPresets','IsActive') IS NOT NULL
-           AND NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_ReportSqlPresets_IsActive' AND object_id = OBJECT_ID('dbo.ReportSqlPresets'))
-        BEGIN
-            CREATE INDEX IX_ReportSqlPresets_IsActive ON dbo.ReportSqlPresets(IsActive);
-        END
-        """
-    )
 
-    # Create ReportTemplates if missing
-    db.execute_non_query(
-        """
-        IF OBJECT_ID('dbo.ReportTemplates', 'U') IS NULL
-        BEGIN
-            CREATE TABLE dbo.ReportTemplates (
-                TemplateId INT IDENTITY(1,1) PRIMARY KEY,
-                PresetId INT NOT NULL,
-                TemplateName VARCHAR(100) NOT NULL,
-                TemplateJson NVARCHAR(MAX) NOT NULL,
-                CreatedBy VARCHAR(50) NULL,
-                CreatedOn DATETIME DEFAULT GETDATE(),
-                UpdatedOn DATETIME NULL,
-                IsActive BIT DEFAULT 1,
-                FOREIGN KEY (PresetId) REFERENCES dbo.ReportSqlPresets(PresetId) ON DELETE CASCADE
-            );
-        END
-        """
-    )
+class _Column(NamedTuple):
+    name: str
+    sql_type: str
+    nullable: bool = True
+    default: Optional[str] = None
+    identity: bool = False  # IDENTITY(1,1) primary key
 
-    # Patch missing columns in dbo.ReportTemplates (if table exists but schema differs)
-    db.execute_non_query(
-        """
-        IF OBJECT_ID('dbo.ReportTemplates', 'U') IS NOT NULL
-        BEGIN
-            IF COL_LENGTH('dbo.ReportTemplates','TemplateId') IS NULL
-                ALTER TABLE dbo.ReportTemplates ADD TemplateId INT IDENTITY(1,1) NOT NULL;
-            IF COL_LENGTH('dbo.ReportTemplates','PresetId') IS NULL
-                ALTER TABLE dbo.ReportTemplates ADD PresetId INT NULL;
-            IF COL_LENGTH('dbo.ReportTemplates','TemplateName') IS NULL
-                ALTER TABLE dbo.ReportTemplates ADD TemplateName VARCHAR(100) NULL;
-            IF COL_LENGTH('dbo.ReportTemplates','TemplateJson') IS NULL
-                ALTER TABLE dbo.ReportTemplates ADD TemplateJson NVARCHAR(MAX) NULL;
-            IF COL_LENGTH('dbo.ReportTemplates','CreatedBy') IS NULL
-                ALTER TABLE dbo.ReportTemplates ADD CreatedBy VARCHAR(50) NULL;
-            IF COL_LENGTH('dbo.ReportTemplates','CreatedOn') IS NULL
-                ALTER TABLE dbo.ReportTemplates ADD CreatedOn DATETIME NULL;
-            IF COL_LENGTH('dbo.ReportTemplates','UpdatedOn') IS NULL
-                ALTER TABLE dbo.ReportTemplates ADD UpdatedOn DATETIME NULL;
-            IF COL_LENGTH('dbo.ReportTemplates','IsActive') IS NULL
-                ALTER TABLE dbo.ReportTemplates ADD IsActive BIT NULL;
-        END
-        """
-    )
 
-    # Create indexes if missing
-    db.execute_non_query(
-        """
-        IF OBJECT_ID('dbo.ReportTemplates', 'U') IS NOT NULL
-           AND COL_LENGTH('dbo.ReportTemplates','PresetId') IS NOT NULL
-           AND NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_ReportTemplates_PresetId' AND object_id = OBJECT_ID('dbo.ReportTemplates'))
-        BEGIN
-            CREATE INDEX IX_ReportTemplates_PresetId ON dbo.ReportTemplates(PresetId);
-        END
-        """
-    )
-    db.execute_non_query(
-        """
-        IF OBJECT_ID('dbo.ReportTemplates', 'U') IS NOT NULL
-           AND COL_LENGTH('dbo.ReportTemplates','TemplateName') IS NOT NULL
-           AND NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_ReportTemplates_TemplateName' AND object_id = OBJECT_ID('dbo.ReportTemplates'))
-        BEGIN
-            CREATE INDEX IX_ReportTemplates_TemplateName ON dbo.ReportTemplates(TemplateName);
-        END
-        """
-    )
-    db.execute_non_query(
-        """
-        IF OBJECT_ID('dbo.ReportTemplates', 'U') IS NOT NULL
-           AND COL_LENGTH('dbo.ReportTemplates','IsActive') IS NOT NULL
-           AND NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_ReportTemplates_IsActive' AND object_id = OBJECT_ID('dbo.ReportTemplates'))
-        BEGIN
-            CREATE INDEX IX_ReportTemplates_IsActive ON dbo.ReportTemplates(IsActive);
-        END
-        """
-    )
+def _create_definition(col: _Column) -> str:
+    """Column definition for CREATE TABLE."""
+    if col.identity:
+        return f"{col.name} {col.sql_type} IDENTITY(1,1) PRIMARY KEY"
+    definition = f"{col.name} {col.sql_type} {'NULL' if col.nullable else 'NOT NULL'}"
+    if col.default:
+        definition += f" DEFAULT {col.default}"
+    return definition
+
+
+def _patch_definition(col: _Column) -> str:
+    """
+    Column definition for ALTER TABLE ... ADD on an older table.
+
+    Always nullable (existing rows have no value); the default still applies
+    to rows inserted afterwards.
+    """
+    if col.identity:
+        return f"{col.name} {col.sql_type} IDENTITY(1,1) NOT NULL"
+    definition = f"{col.name} {col.sql_type} NULL"
+    if col.default:
+        definition += f" DEFAULT {col.default}"
+    return definition
+
 
-    # Add FK if possible and missing (optional if existing data prevents it)
-    db.execute_non_query(
-        """
-        IF OBJECT_ID('dbo.ReportTemplates', 'U') IS NOT NULL
-           AND OBJECT_ID('dbo.ReportSqlPresets', 'U') IS NOT NULL
-           AND COL_LENGTH('dbo.ReportTemplates','PresetId') IS NOT NULL
-           AND COL_LENGTH('dbo.ReportSqlPresets','PresetId') IS NOT NULL
-           AND NOT EXISTS (
-               SELECT 1
-               FROM sys.foreign_keys
-               WHERE name = 'FK_ReportTemplates_ReportSqlPresets'
-                 AND parent_object_id = OBJECT_ID('dbo.ReportTemplates')
-           )
-        BEGIN
-            BEGIN TRY
-                ALTER TABLE dbo.ReportTemplates
-                ADD CONSTRAINT FK_ReportTemplates_ReportSqlPresets
-                FOREIGN KEY (PresetId) REFERENCES dbo.ReportSqlPresets(PresetId) ON DELETE CASCADE;
-            END TRY
-            BEGIN CATCH
-                -- If existing data violates FK or permissions are limited, skip FK creation.
-            END CATCH
-        END
-        """
+_TABLES = {
+    "ReportSqlPresets": (
+        _Column("PresetId", "INT", identity=True),
+        _Column("PresetName", "VARCHAR(100)", nullable=False),
+        _Column("SqlJson", "NVARCHAR(MAX)", nullable=False),
+        _Column("ExpectedParams", "NVARCHAR(500)"),
+        _Column("CreatedBy", "VARCHAR(50)"),
+        _Column("CreatedOn", "DATETIME", default="GETDATE()"),
+        _Column("UpdatedOn", "DATETIME"),
+        _Column("IsActive", "BIT", default="1"),
+    ),
+    "ReportTemplates": (
+        _Column("TemplateId", "INT", identity=True),
+        _Column("PresetId", "INT", nullable=False),
+        _Column("TemplateName", "VARCHAR(100)", nullable=False),
+        _Column("TemplateJson", "NVARCHAR(MAX)", nullable=False),
+        _Column("CreatedBy", "VARCHAR(50)"),
+        _Column("CreatedOn", "DATETIME", default="GETDATE()"),
+        _Column("UpdatedOn", "DATETIME"),
+        _Column("IsActive", "BIT", default="1"),
+    ),
+}
+
+# (index name, table, key columns, INCLUDE columns, filter)
+_INDEXES = (
+    ("IX_ReportSqlPresets_PresetName", "ReportSqlPresets", "PresetName", None, None),
+    ("IX_ReportSqlPresets_IsActive", "ReportSqlPresets", "IsActive", None, None),
+    ("IX_ReportTemplates_PresetId", "ReportTemplates", "PresetId", None, None),
+    ("IX_ReportTemplates_TemplateName", "ReportTemplates", "TemplateName", None, None),
+    ("IX_ReportTemplates_IsActive", "ReportTemplates", "IsActive", None, None),
+    # Filtered indexes covering the IsActive = 1 lookups the services run
+    # (active templates by preset, newest first; duplicate-name checks)
+    ("IX_ReportTemplates_PresetId_Active", "ReportTemplates",
+     "PresetId, CreatedOn DESC", "TemplateName", "IsActive = 1"),
+    ("IX_ReportTemplates_TemplateName_Active", "ReportTemplates",
+     "TemplateName, PresetId", None, "IsActive = 1"),
+)
+
+# (constraint name, table, column, referenced table, referenced column)
+_FOREIGN_KEYS = (
+    ("FK_ReportTemplates_ReportSqlPresets", "ReportTemplates", "PresetId",
+     "ReportSqlPresets", "PresetId"),
+)
+
+_TABLE_LIST = ", ".join(f"'{name}'" for name in _TABLES)
+
+# Every column, index and FK on the report tables, in one round trip
+_CATALOG_QUERY = f"""
+    SELECT 'column' AS Kind, t.name AS TableName, c.name AS ObjectName
+    FROM sys.tables t
+    JOIN sys.columns c ON c.object_id = t.object_id
+    WHERE t.schema_id = SCHEMA_ID('dbo') AND t.name IN ({_TABLE_LIST})
+    UNION ALL
+    SELECT 'index', t.name, i.name
+    FROM sys.tables t
+    JOIN sys.indexes i ON i.object_id = t.object_id
+    WHERE t.schema_id = SCHEMA_ID('dbo') AND t.name IN ({_TABLE_LIST})
+      AND i.name IS NOT NULL
+    UNION ALL
+    SELECT 'fk', t.name, fk.name
+    FROM sys.tables t
+    JOIN sys.foreign_keys fk ON fk.parent_object_id = t.object_id
+    WHERE t.schema_id = SCHEMA_ID('dbo') AND t.name IN ({_TABLE_LIST})
+"""
+
+
+def _catalog_snapshot() -> Set[Tuple[str, str, str]]:
+    """Return the existing (kind, table, name) objects, tables included."""
+    snapshot = set()
+    for row in db.execute_query(_CATALOG_QUERY):
+        snapshot.add((row["Kind"], row["TableName"], row["ObjectName"]))
+        snapshot.add(("table", row["TableName"], ""))
+    return snapshot
+
+
+def _missing_ddl(snapshot: Set[Tuple[str, str, str]]) -> List[str]:
+    """
+    Generate the DDL statements for objects absent from the snapshot, in order.
+
+    Each statement keeps an existence guard, so it stays harmless if another
+    process created the object after the snapshot was taken.
+    """
+    steps = []
+
+    for table, columns in _TABLES.items():
+        if ("table", table, "") not in snapshot:
+            column_defs = ",\n    ".join(_create_definition(col) for col in columns)
+            steps.append(
+                f"IF OBJECT_ID('dbo.{table}', 'U') IS NULL\n"
+                f"CREATE TABLE dbo.{table} (\n    {column_defs}\n);"
+            )
+            continue
+        # Patch missing columns (table exists but schema differs)
+        for col in columns:
+            if ("column", table, col.name) not in snapshot:
+                steps.append(
+                    f"IF COL_LENGTH('dbo.{table}', '{col.name}') IS NULL\n"
+                    f"ALTER TABLE dbo.{table} ADD {_patch_definition(col)};"
+                )
+
+    for name, table, key_columns, include, where in _INDEXES:
+        if ("index", table, name) not in snapshot:
+            ddl = f"CREATE INDEX {name} ON dbo.{table}({key_columns})"
+            if include:
+                ddl += f" INCLUDE ({include})"
+            if where:
+                ddl += f" WHERE {where}"
+            steps.append(
+                f"IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = '{name}' "
+                f"AND object_id = OBJECT_ID('dbo.{table}'))\n{ddl};"
+            )
+
+    for name, table, column, ref_table, ref_column in _FOREIGN_KEYS:
+        if ("fk", table, name) not in snapshot:
+            # Skip the FK while orphan rows exist instead of letting the ALTER
+            # scan, fail and roll back. With the data just checked, WITH NOCHECK
+            # avoids a second validation scan (new rows are still enforced).
+            # TRY/CATCH still covers limited permissions.
+            steps.append(
+                f"IF NOT EXISTS (SELECT 1 FROM sys.foreign_keys WHERE name = '{name}' "
+                f"AND parent_object_id = OBJECT_ID('dbo.{table}'))\n"
+                f"AND NOT EXISTS (SELECT 1 FROM dbo.{table} c WHERE c.{column} IS NOT NULL "
+                f"AND NOT EXISTS (SELECT 1 FROM dbo.{ref_table} r WHERE r.{ref_column} = c.{column}))\n"
+                f"BEGIN\n"
+                f"    BEGIN TRY\n"
+                f"        ALTER TABLE dbo.{table} WITH NOCHECK ADD CONSTRAINT {name}\n"
+                f"        FOREIGN KEY ({column}) REFERENCES dbo.{ref_table}({ref_column}) ON DELETE CASCADE;\n"
+                f"    END TRY\n"
+                f"    BEGIN CATCH\n"
+                f"        -- skipped\n"
+                f"    END CATCH\n"
+                f"END"
+            )
+
+    return steps
+
+
+def _exec_step(step: str) -> str:
+    # EXEC compiles each step when it runs, so later steps can use columns
+    # that an earlier ALTER TABLE in the same batch has just added
+    return "EXEC(N'" + step.replace("'", "''") + "');"
+
+
+# Serializes schema changes across processes/workers bootstrapping the same
+# database: the IF NOT EXISTS guards alone can race (both pass, one CREATE
+# fails). Transaction-owned, so it is held until get_connection commits (or
+# rolls back) the DDL: another process only gets past the lock once the new
+# objects are committed and visible to its guards. A transaction is opened
+# here if the driver has not started one yet (the connection runs with
+# autocommit off, so get_connection's commit ends it either way).
+_APPLOCK_ACQUIRE = """DECLARE @lock INT;
+IF @@TRANCOUNT = 0 BEGIN TRANSACTION;
+EXEC @lock = sp_getapplock @Resource = 'EnsureCompanySchema', @LockMode = 'Exclusive',
+    @LockOwner = 'Transaction', @LockTimeout = 10000;
+IF @lock < 0
+    THROW 50000, 'Timed out waiting for another process to finish the company schema update', 1;
+"""
+
+
+def _build_batch(steps: List[str]) -> str:
+    # All pending steps go as one batch: one round trip instead of one per step.
+    # No explicit release: the applock goes with the commit/rollback.
+    return (
+        "SET NOCOUNT ON;\n"
+        + _APPLOCK_ACQUIRE
+        + "\n".join(_exec_step(step) for step in steps)
     )
 
 
+def _recently_ensured(db_key: str) -> bool:
+    checked_at = _ensured_databases.get(db_key)
+    return checked_at is not None and time.monotonic() - checked_at < _REVALIDATE_SECONDS
+
+
+def ensure_company_schema() -> None:
+    # Only company databases carry the report tables; never create them in
+    # the auth DB (e.g. if called before a company is selected)
+    if db._current_db_context == AUTH_DB_CONTEXT:
+        return
+    db_key = db.connection_string
+    if _recently_ensured(db_key):
+        return
+    # Serialize first-time runs so concurrent selects don't race the DDL
+    with _ensured_lock:
+        if _recently_ensured(db_key):
+            return
+        pending = _missing_ddl(_catalog_snapshot())
+        # Up-to-date databases (the usual case) get no DDL at all
+        if pending:
+            db.execute_non_query(_build_batch(pending))
+        _ensured_databases[db_key] = time.monotonic()
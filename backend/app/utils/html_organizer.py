@@ -3,14 +3,66 @@ HTML organizer for reorganizing bill-content and bill-footer sections
 and fixing pagination in generated HTML.
 """
 import re
-import json
+from operator import attrgetter
 from typing import Dict, Any, List, Tuple
 from bs4 import BeautifulSoup
+from app.utils.cache import cached_json_loads
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def _select_parser() -> str:
+    """Use lxml (C parser, much faster) when installed, else the stdlib parser."""
+    try:
+        import lxml  # noqa: F401
+        return 'lxml'
+    except ImportError:
+        logger.warning("lxml not available, falling back to html.parser for HTML organizing")
+        return 'html.parser'
+
+
+_PARSER = _select_parser()
+
+# Style patterns, compiled once (the helpers run per element, several times per page)
+_RE_TOP = re.compile(r'top:\s*(\d+\.?\d*)px')
+_RE_TOP_SUB = re.compile(r'top:\s*\d+\.?\d*px')
+_RE_LEFT = re.compile(r'left:\s*(\d+\.?\d*)px')
+_RE_PADDING = re.compile(r'padding:\s*(\d+)px')
+_RE_FONT_SIZE = re.compile(r'font-size:\s*(\d+)px')
+_RE_POSITION_ABSOLUTE = re.compile(r'position:\s*absolute;?\s*')
+_RE_POSITION_ABSOLUTE_TRAILING = re.compile(r'position:\s*absolute\s*')
+_RE_TOP_DECL = re.compile(r'top:\s*\d+\.?\d*px;?\s*')
+_RE_TOP_DECL_TRAILING = re.compile(r'top:\s*\d+\.?\d*px\s*')
+_RE_REPEATED_SEMICOLONS = re.compile(r';\s*;+')
+_RE_LEADING_SEMICOLON = re.compile(r'^\s*;\s*')
+_RE_WHITESPACE = re.compile(r'\s+')
+
+# Page section classes -> key in the per-page metadata built by _collect_pages
+_PAGE_SECTIONS = {
+    'bill-container': 'container',
+    'page-header': 'page_header',
+    'bill-header': 'header',
+    'bill-content': 'content',
+    'bill-footer': 'footer',
+    'page-footer': 'page_footer',
+}
+
+
+class _ContentItem:
+    """A bill-content table or field collected for placement."""
+    
+    __slots__ = ('type', 'element', 'page_idx', 'y_pos', 'style', 'height')
+    
+    def __init__(self, element_type: str, element, page_idx: int, y_pos: float, style: str):
+        self.type = element_type
+        self.element = element
+        self.page_idx = page_idx
+        self.y_pos = y_pos
+        self.style = style
+        self.height = None  # Filled in during placement
+
+
 class HtmlOrganizer:
     """Organizes and fixes HTML bill-content and bill-footer pagination."""
     
@@ -27,182 +79,222 @@ class HtmlOrganizer:
             template_json: Template JSON string for configuration
             
         Returns:
-            Reorganized HTML string
+            Reorganized HTML string (the input unchanged if the template JSON
+            can't be parsed)
         """
+        # Nothing to organize without bill pages: skip parsing entirely
+        if 'bill-page' not in html:
+            return html
+        
         try:
-            template_config = json.loads(template_json)
-            soup = BeautifulSoup(html, 'html.parser')
-            
-            # Get section heights from template
-            section_heights = template_config.get('sectionHeights', {})
-            page_header_height = section_heights.get('pageHeader', 180)
-            page_footer_height = section_heights.get('pageFooter', 175)
-            bill_header_height = section_heights.get('billHeader', 200)
-            
-            # Page height (A4: 1123px)
-            page_height = 1123
-            
-            # Available height per page (page height - page header - page footer)
-            available_height_first_page = page_height - page_header_height - page_footer_height - bill_header_height
-            available_height_other_pages = page_height - page_header_height - page_footer_height
-            
-            # Find all bill pages
-            bill_pages = soup.find_all('div', class_='bill-page')
-            
-            if not bill_pages:
-                return html
-            
-            # Collect all bill-content elements from all pages, preserving order
-            all_content_items = []  # List of all elements (tables, fields) with their original Y positions
-            all_bill_footers = []
+            template_config = cached_json_loads(template_json)
+        except (TypeError, ValueError) as e:
+            logger.error(f"Error organizing HTML: invalid template JSON: {str(e)}")
+            return html
+        if not isinstance(template_config, dict):
+            logger.error("Error organizing HTML: template JSON is not an object")
+            return html
+        
+        # Memo of element heights for this call only: id(element) ->
+        # (element, type, height); the element is kept to guard against id
+        # reuse. A local, passed down, so concurrent calls on the shared
+        # instance don't share or reset each other's memo.
+        height_cache: Dict[int, Tuple[Any, str, float]] = {}
+        soup = BeautifulSoup(html, _PARSER)
+        
+        # Get section heights from template
+        section_heights = template_config.get('sectionHeights', {})
+        page_header_height = section_heights.get('pageHeader', 180)
+        page_footer_height = section_heights.get('pageFooter', 175)
+        bill_header_height = section_heights.get('billHeader', 200)
+        
+        # Page height (A4: 1123px)
+        page_height = 1123
+        
+        # Available height per page (page height - page header - page footer)
+        available_height_first_page = page_height - page_header_height - page_footer_height - bill_header_height
+        available_height_other_pages = page_height - page_header_height - page_footer_height
+        
+        # Find all bill pages and their sections in one walk; the steps
+        # below read (and keep up to date) this instead of searching again
+        page_meta = self._collect_pages(soup)
+        
+        if not page_meta:
+            return html
+        
+        # Collect all bill-content elements from all pages, preserving order
+        all_content_items = []  # List of all elements (tables, fields) with their original Y positions
+        all_bill_footers = []
+        
+        for page_idx, meta in enumerate(page_meta):
+            page = meta['page']
+            bill_content = meta['content']
+            bill_footer = meta['footer']
             
-            for page_idx, page in enumerate(bill_pages):
-                bill_content = page.find('div', class_='bill-content')
-                bill_footer = page.find('div', class_='bill-footer')
-                
-                if bill_content:
-                    # Extract all tables and fields from this bill-content
-                    # Get all child divs and preserve their order
-                    children = bill_content.find_all(['div'], recursive=False)
-                    
-                    for child in children:
-                        if 'bill-content-table' in child.get('class', []):
-                            all_content_items.append({
-                                'type': 'table',
-                                'element': child,
-                                'original_page': page,
-                                'original_page_idx': page_idx,
-                                'y_pos': self._get_top_from_style(child.get('style', ''))
-                            })
-                        elif 'field' in child.get('class', []):
-                            all_content_items.append({
-                                'type': 'field',
-                                'element': child,
-                                'original_page': page,
-                                'original_page_idx': page_idx,
-                                'y_pos': self._get_top_from_style(child.get('style', ''))
-                            })
+            if bill_content:
+                # Extract all tables and fields from this bill-content
+                # Walk the direct child divs in order (cheaper than find_all)
+                page_items = []
+                for child in bill_content.children:
+                    if child.name != 'div':
+                        continue
+                    classes = child.get('class') or ()
+                    if 'bill-content-table' in classes:
+                        element_type = 'table'
+                    elif 'field' in classes:
+                        element_type = 'field'
+                    else:
+                        continue
+                    # Style is read once here and carried with the item
+                    style = child.get('style', '')
+                    page_items.append(
+                        _ContentItem(element_type, child, page_idx, self._get_top_from_style(style), style)
+                    )
                 
-                if bill_footer:
-                    all_bill_footers.append({
-                        'page': page,
-                        'footer': bill_footer,
-                        'page_idx': page_idx
-                    })
+                # Sort by Y position to maintain order. Pages are visited in
+                # order, so sorting each page's items is the same as sorting
+                # everything by (page, Y), without building a key tuple per item
+                page_items.sort(key=attrgetter('y_pos'))
+                all_content_items.extend(page_items)
             
-            # Sort content items by their Y position to maintain order
-            all_content_items.sort(key=lambda x: (x['original_page_idx'], x['y_pos']))
-            
-            # Reorganize all content items across pages
-            reorganized = self._reorganize_content_items_simple(
-                all_content_items,
-                bill_pages,
-                available_height_first_page,
-                available_height_other_pages,
-                bill_header_height
+            if bill_footer:
+                all_bill_footers.append({
+                    'page': page,
+                    'footer': bill_footer,
+                    'page_idx': page_idx
+                })
+        
+        # Reorganize all content items across pages
+        reorganized, page_max_bottom = self._reorganize_content_items_simple(
+            soup,
+            all_content_items,
+            page_meta,
+            available_height_first_page,
+            available_height_other_pages,
+            bill_header_height,
+            height_cache
+        )
+        
+        # Place bill-footer on the last page with content
+        if all_bill_footers and reorganized:
+            last_content_page_idx = max(item['target_page_idx'] for item in reorganized if 'target_page_idx' in item)
+            self._place_bill_footer_optimized(
+                all_bill_footers,
+                last_content_page_idx,
+                page_meta,
+                bill_header_height,
+                page_max_bottom.get(last_content_page_idx, 0)
             )
-            
-            # Place bill-footer on the last page with content
-            if all_bill_footers and reorganized:
-                last_content_page_idx = max(item['target_page_idx'] for item in reorganized if 'target_page_idx' in item)
-                self._place_bill_footer_optimized(
-                    all_bill_footers,
-                    last_content_page_idx,
-                    bill_pages,
-                    bill_header_height,
-                    reorganized
-                )
-            
-            # Try to consolidate last page content onto previous page
-            self._consolidate_last_page(bill_pages, available_height_first_page, available_height_other_pages, bill_header_height)
-            
-            # Fix bill-content child elements: convert to relative positioning, remove top, keep only left
-            self._fix_bill_content_positioning(bill_pages)
-            
-            # Fix bill-footer positioning: remove top/absolute, place before page-footer
-            self._fix_bill_footer_positioning(bill_pages)
-            
-            # Remove empty pages (pages with no bill-content or only empty bill-content)
-            self._remove_empty_pages(bill_pages)
-            
-            return str(soup)
-            
-        except Exception as e:
-            logger.error(f"Error organizing HTML: {str(e)}")
-            return html
+        
+        # Try to consolidate last page content onto previous page
+        self._consolidate_last_page(
+            page_meta, available_height_first_page, available_height_other_pages, bill_header_height, height_cache
+        )
+        
+        # Fix bill-content child elements: convert to relative positioning, remove top, keep only left
+        self._fix_bill_content_positioning(page_meta)
+        
+        # Fix bill-footer positioning: remove top/absolute, place before page-footer
+        self._fix_bill_footer_positioning(page_meta)
+        
+        # Remove empty pages (pages with no bill-content or only empty bill-content)
+        self._remove_empty_pages(page_meta)
+        
+        return str(soup)
+    
+    def _collect_pages(self, soup: BeautifulSoup) -> List[Dict[str, Any]]:
+        """
+        Find all bill-page divs and their sections in a single document walk.
+        
+        Returns:
+            One dict per page, in document order, with the page under 'page' and
+            the first div of each section class inside it (as page.find would
+            return it) under the _PAGE_SECTIONS keys, None when absent
+        """
+        page_meta = []
+        meta_by_page: Dict[int, Dict[str, Any]] = {}
+        for element in soup.descendants:
+            if element.name != 'div':
+                continue
+            classes = element.get('class') or ()
+            for cls in classes:
+                key = _PAGE_SECTIONS.get(cls)
+                if key is None:
+                    continue
+                # Pages are visited before their descendants, so every
+                # enclosing page is already registered
+                for parent in element.parents:
+                    meta = meta_by_page.get(id(parent))
+                    if meta is not None and meta[key] is None:
+                        meta[key] = element
+            if 'bill-page' in classes:
+                meta = dict.fromkeys(_PAGE_SECTIONS.values())
+                meta['page'] = element
+                page_meta.append(meta)
+                meta_by_page[id(element)] = meta
+        return page_meta
     
     def _reorganize_content_items_simple(
         self,
-        all_content_items: List[Dict],
-        bill_pages: List,
+        soup: BeautifulSoup,
+        all_content_items: List[_ContentItem],
+        page_meta: List[Dict[str, Any]],
         available_height_first: float,
         available_height_other: float,
-        bill_header_height: float
-    ) -> List[Dict]:
+        bill_header_height: float,
+        height_cache: Dict[int, Tuple[Any, str, float]]
+    ) -> Tuple[List[Dict], Dict[int, float]]:
         """
         Reorganize all content items (tables and fields) across pages.
         
+        Args:
+            soup: Parsed document, used to create missing bill-content containers
+            page_meta: Per-page sections from _collect_pages (updated with
+                any bill-content container created here)
+            height_cache: organize_html's element height memo
+        
         Returns:
-            List of reorganized items with target_page_idx info
+            (reorganized items with target_page_idx info,
+             page index -> bottom of the lowest element placed on it)
         """
         if not all_content_items:
-            return []
-        
-        # Get soup object from first element to create new tags
-        soup = None
-        if all_content_items:
-            soup = all_content_items[0]['element']
-            # Navigate up to find the BeautifulSoup object
-            while soup and hasattr(soup, 'parent') and soup.parent:
-                if hasattr(soup, 'new_tag'):  # BeautifulSoup object has new_tag method
-                    break
-                soup = soup.parent
-        
-        # Fallback: get soup from bill_pages
-        if not soup or not hasattr(soup, 'new_tag'):
-            if bill_pages:
-                soup = bill_pages[0]
-                while soup and hasattr(soup, 'parent') and soup.parent:
-                    if hasattr(soup, 'new_tag'):
-                        break
-                    soup = soup.parent
+            return [], {}
         
         reorganized = []
+        page_max_bottom: Dict[int, float] = {}
         current_page_idx = 0
         current_height = 0
         available_height = available_height_first
         
         # Create or find bill-content containers for each page
         page_content_containers = {}
-        for idx, page in enumerate(bill_pages):
-            bill_content = page.find('div', class_='bill-content')
+        for idx, meta in enumerate(page_meta):
+            bill_content = meta['content']
             if not bill_content:
-                # Create bill-content container if soup is available
-                if soup and hasattr(soup, 'new_tag'):
-                    bill_content = soup.new_tag('div', class_='bill-content', style='position: relative; top: 0px;')
-                    bill_container = page.find('div', class_='bill-container')
-                    if bill_container:
-                        # Insert after bill-header if exists, otherwise after page-header
-                        bill_header = page.find('div', class_='bill-header')
-                        if bill_header:
-                            bill_header.insert_after(bill_content)
-                        else:
-                            page_header = page.find('div', class_='page-header')
-                            if page_header:
-                                page_header.insert_after(bill_content)
-                else:
-                    # Can't create, skip this page
-                    continue
+                # Create bill-content container
+                bill_content = soup.new_tag(
+                    'div', attrs={'class': 'bill-content', 'style': 'position: relative; top: 0px;'}
+                )
+                if meta['container']:
+                    # Insert after bill-header if exists, otherwise after page-header
+                    anchor = meta['header'] or meta['page_header']
+                    if anchor:
+                        anchor.insert_after(bill_content)
+                        meta['content'] = bill_content
             page_content_containers[idx] = bill_content
         
+        # Elements to move into each page's container, in placement order.
+        # Moved in one batch per container after placement.
+        moves: Dict[int, List] = {}
+        
         # Process each content item
         for item in all_content_items:
-            element = item['element']
-            element_type = item['type']
-            y_pos = item.get('y_pos', 0)  # Y position is gap from previous element
+            element = item.element
+            y_pos = item.y_pos  # Y position is gap from previous element
             
             # Calculate element height
-            element_height = self._calculate_element_height(element, element_type)
+            element_height = self._calculate_element_height(element, item.type, height_cache)
+            item.height = element_height
             
             # Calculate adjusted position: Y is gap from previous element
             if len(reorganized) == 0:
@@ -228,27 +320,27 @@ class HtmlOrganizer:
                 if not target_container:
                     continue
                 
-                # Move element to target container
-                element.extract()
-                target_container.append(element)
+                # Queue element for its target container
+                moves.setdefault(current_page_idx, []).append(element)
                 
                 # Update element position
-                new_style = element.get('style', '')
-                new_style = self._update_style_top(new_style, adjusted_y)
-                element['style'] = new_style
+                item.style = self._update_style_top(item.style, adjusted_y)
+                element['style'] = item.style
                 
                 reorganized.append({
                     'element': element,
                     'target_page_idx': current_page_idx,
                     'offset_y': adjusted_y,
-                    'height': element_height
+                    'height': element_height,
+                    'style': item.style
                 })
                 
                 current_height = adjusted_y + element_height
+                page_max_bottom[current_page_idx] = max(page_max_bottom.get(current_page_idx, 0), current_height)
             else:
                 # Element doesn't fit, move to next page
                 current_page_idx += 1
-                if current_page_idx >= len(bill_pages):
+                if current_page_idx >= len(page_meta):
                     # Can't fit, skip (shouldn't normally happen)
                     continue
                 
@@ -262,55 +354,94 @@ class HtmlOrganizer:
                 # On new page, use Y as gap from top
                 adjusted_y = y_pos
                 
-                # Move element to target container
-                element.extract()
-                target_container.append(element)
+                # Queue element for its target container
+                moves.setdefault(current_page_idx, []).append(element)
                 
                 # Update element position
-                new_style = element.get('style', '')
-                new_style = self._update_style_top(new_style, adjusted_y)
-                element['style'] = new_style
+                item.style = self._update_style_top(item.style, adjusted_y)
+                element['style'] = item.style
                 
                 reorganized.append({
                     'element': element,
                     'target_page_idx': current_page_idx,
                     'offset_y': adjusted_y,
-                    'height': element_height
+                    'height': element_height,
+                    'style': item.style
                 })
                 
                 current_height = adjusted_y + element_height
+                page_max_bottom[current_page_idx] = max(page_max_bottom.get(current_page_idx, 0), current_height)
         
-        return reorganized
+        # Detach every queued element first, then append each container's
+        # batch: the source containers shrink as we go instead of being
+        # scanned at full size for every single move
+        for elements in moves.values():
+            for element in elements:
+                element.extract()
+        for idx, elements in moves.items():
+            page_content_containers[idx].extend(elements)
+        
+        return reorganized, page_max_bottom
     
-    def _calculate_element_height(self, element: BeautifulSoup, element_type: str) -> float:
+    def _calculate_element_height(
+        self, element: BeautifulSoup, element_type: str, height_cache: Dict[int, Tuple[Any, str, float]]
+    ) -> float:
         """
         Calculate the actual height of a content element (table or field).
+        
+        Memoized in the organize_html call's height_cache: placement, footer
+        placement and page consolidation all ask for the same heights, and
+        moving an element or rewriting its top doesn't change them.
+        """
+        cached = height_cache.get(id(element))
+        if cached is not None and cached[0] is element and cached[1] == element_type:
+            return cached[2]
+        height = self._measure_element_height(element, element_type)
+        height_cache[id(element)] = (element, element_type, height)
+        return height
+    
+    def _measure_element_height(self, element: BeautifulSoup, element_type: str) -> float:
+        """
+        Estimate element height from its table rows / font size.
         """
         if element_type == 'table':
-            table = element.find('table')
+            table = next((node for node in element.descendants if node.name == 'table'), None)
             if table:
-                rows = table.find_all('tr')
-                if rows:
+                # Count rows and find the first td / th in a single walk
+                row_count = 0
+                first_td = None
+                first_th = None
+                for node in table.descendants:
+                    name = node.name
+                    if name == 'tr':
+                        row_count += 1
+                    elif name == 'td':
+                        if first_td is None:
+                            first_td = node
+                    elif name == 'th':
+                        if first_th is None:
+                            first_th = node
+                if row_count:
                     # Calculate row height based on padding and borders
-                    # Get padding from first cell if available
-                    first_cell = table.find('td') or table.find('th')
+                    # Get padding from first cell if available (td preferred)
+                    first_cell = first_td or first_th
                     cell_padding = 10  # Default
                     if first_cell:
                         cell_style = first_cell.get('style', '')
-                        padding_match = re.search(r'padding:\s*(\d+)px', cell_style)
+                        padding_match = _RE_PADDING.search(cell_style) if 'padding:' in cell_style else None
                         if padding_match:
                             cell_padding = int(padding_match.group(1))
                     
                     # Row height: padding top + padding bottom + border top + border bottom + text height
                     # Assuming border is 1px and text is ~15px
                     row_height = (cell_padding * 2) + 2 + 15  # ~37px per row
-                    return row_height * len(rows)
+                    return row_height * row_count
             return 50  # Minimum table height
         else:  # field
             # Estimate field height based on font size or default
             style = element.get('style', '')
             # Try to get font-size from style or estimate
-            font_size_match = re.search(r'font-size:\s*(\d+)px', style)
+            font_size_match = _RE_FONT_SIZE.search(style) if 'font-size:' in style else None
             if font_size_match:
                 font_size = int(font_size_match.group(1))
                 return font_size * 1.5  # Estimate height
@@ -320,9 +451,9 @@ class HtmlOrganizer:
         """
         Extract top value from style string.
         """
-        if not style:
+        if not style or 'top:' not in style:
             return 0
-        top_match = re.search(r'top:\s*(\d+\.?\d*)px', style)
+        top_match = _RE_TOP.search(style)
         if top_match:
             return float(top_match.group(1))
         return 0
@@ -332,7 +463,7 @@ class HtmlOrganizer:
         Update or add top value in style string.
         """
         if 'top:' in style:
-            style = re.sub(r'top:\s*\d+\.?\d*px', f'top: {new_top}px', style)
+            style = _RE_TOP_SUB.sub(f'top: {new_top}px', style)
         else:
             style = f'{style}; top: {new_top}px' if style else f'top: {new_top}px'
         return style
@@ -341,12 +472,16 @@ class HtmlOrganizer:
         self,
         bill_footers: List[Dict],
         last_content_page_idx: int,
-        bill_pages: List,
+        page_meta: List[Dict[str, Any]],
         bill_header_height: float,
-        reorganized_items: List[Dict]
+        max_bottom: float
     ):
         """
         Place bill-footer on the last page with bill-content, calculating position correctly.
+        
+        Args:
+            max_bottom: Bottom of the lowest element placed on the target page,
+                as tracked during reorganization
         """
         if not bill_footers:
             return
@@ -355,27 +490,12 @@ class HtmlOrganizer:
         last_footer = bill_footers[-1]['footer']
         
         # Find the target page
-        target_page = bill_pages[last_content_page_idx] if last_content_page_idx < len(bill_pages) else bill_pages[-1]
+        target_meta = page_meta[last_content_page_idx] if last_content_page_idx < len(page_meta) else page_meta[-1]
+        target_page = target_meta['page']
         
-        # Find bill-content on target page and calculate max bottom
-        bill_content = target_page.find('div', class_='bill-content')
+        # Position footer below the target page's bill-content
+        bill_content = target_meta['content']
         if bill_content:
-            # Calculate the maximum bottom position of all elements in bill-content
-            max_bottom = 0
-            
-            tables = bill_content.find_all('div', class_='bill-content-table')
-            fields = bill_content.find_all('div', class_='field')
-            
-            for table in tables:
-                table_top = self._get_top_from_style(table.get('style', ''))
-                table_height = self._calculate_element_height(table, 'table')
-                max_bottom = max(max_bottom, table_top + table_height)
-            
-            for field in fields:
-                field_top = self._get_top_from_style(field.get('style', ''))
-                field_height = self._calculate_element_height(field, 'field')
-                max_bottom = max(max_bottom, field_top + field_height)
-            
             # Calculate footer position: bill_header_height + max_bottom + spacing
             footer_top = bill_header_height + max_bottom + 20  # 20px spacing
             
@@ -390,52 +510,57 @@ class HtmlOrganizer:
         # Remove footer from other pages
         for footer_item in bill_footers[:-1]:  # Keep only last footer
             footer_item['footer'].decompose()
+            page_meta[footer_item['page_idx']]['footer'] = None
         
         # Move footer to target page if not already there
         if last_footer.parent != target_page:
             target_page.append(last_footer)
+            page_meta[bill_footers[-1]['page_idx']]['footer'] = None
+            target_meta['footer'] = last_footer
     
     def _consolidate_last_page(
         self,
-        bill_pages: List,
+        page_meta: List[Dict[str, Any]],
         available_height_first: float,
         available_height_other: float,
-        bill_header_height: float
+        bill_header_height: float,
+        height_cache: Dict[int, Tuple[Any, str, float]]
     ):
         """
         Try to move content from the last page to the previous page if there's space.
         This consolidates pages so we don't have a separate last page with just a field and footer.
         """
-        if len(bill_pages) < 2:
+        if len(page_meta) < 2:
             return
         
-        last_page = bill_pages[-1]
-        prev_page = bill_pages[-2]
+        last_meta = page_meta[-1]
+        prev_meta = page_meta[-2]
+        prev_page = prev_meta['page']
         
         # Get content from last page
-        last_bill_content = last_page.find('div', class_='bill-content')
-        last_bill_footer = last_page.find('div', class_='bill-footer')
+        last_bill_content = last_meta['content']
+        last_bill_footer = last_meta['footer']
         
         if not last_bill_content and not last_bill_footer:
             return
         
         # Get content from previous page
-        prev_bill_content = prev_page.find('div', class_='bill-content')
+        prev_bill_content = prev_meta['content']
         if not prev_bill_content:
             return
         
         # Calculate available space on previous page
         # Determine if previous page is first page (has bill-header)
-        prev_has_bill_header = prev_page.find('div', class_='bill-header') is not None
+        prev_has_bill_header = prev_meta['header'] is not None
         available_height = available_height_first if prev_has_bill_header else available_height_other
         
         # Calculate current content height on previous page
-        prev_content_height = self._calculate_page_content_height(prev_bill_content)
+        prev_content_height = self._calculate_page_content_height(prev_bill_content, height_cache)
         
         # Calculate last page content height
         last_content_height = 0
         if last_bill_content:
-            last_content_height = self._calculate_page_content_height(last_bill_content)
+            last_content_height = self._calculate_page_content_height(last_bill_content, height_cache)
         
         # Calculate bill-footer height
         footer_height = 0
@@ -450,41 +575,31 @@ class HtmlOrganizer:
         # or if there's enough space
         last_page_has_minimal_content = (
             last_content_height < 100 and  # Less than 100px of content
-            (not last_bill_content or len(last_bill_content.find_all(['div'], recursive=False)) <= 2)
+            (not last_bill_content or sum(1 for child in last_bill_content.children if child.name == 'div') <= 2)
         )
         
         if total_new_content <= remaining_space or last_page_has_minimal_content:
-            # Can fit, move content
-            prev_max_bottom = self._get_max_bottom(prev_bill_content)
+            # Can fit, move content (nothing has changed on the previous page
+            # since its height was measured above)
+            prev_max_bottom = prev_content_height
             
             # Move bill-content items from last page to previous page
             if last_bill_content:
-                tables = last_bill_content.find_all('div', class_='bill-content-table')
-                fields = last_bill_content.find_all('div', class_='field')
+                tables, fields = self._split_content_elements(last_bill_content)
+                items_to_move = [(table, 'table') for table in tables] + [(field, 'field') for field in fields]
                 
-                for table in tables:
-                    table.extract()
+                for element, element_type in items_to_move:
                     # Update position relative to previous page content
-                    current_top = self._get_top_from_style(table.get('style', ''))
-                    new_top = prev_max_bottom + current_top
-                    new_style = self._update_style_top(table.get('style', ''), new_top)
-                    table['style'] = new_style
-                    prev_bill_content.append(table)
+                    style = element.get('style', '')
+                    new_top = prev_max_bottom + self._get_top_from_style(style)
+                    element['style'] = self._update_style_top(style, new_top)
                     # Update prev_max_bottom
-                    table_height = self._calculate_element_height(table, 'table')
-                    prev_max_bottom = new_top + table_height
+                    prev_max_bottom = new_top + self._calculate_element_height(element, element_type, height_cache)
                 
-                for field in fields:
-                    field.extract()
-                    # Update position relative to previous page content
-                    current_top = self._get_top_from_style(field.get('style', ''))
-                    new_top = prev_max_bottom + current_top
-                    new_style = self._update_style_top(field.get('style', ''), new_top)
-                    field['style'] = new_style
-                    prev_bill_content.append(field)
-                    # Update prev_max_bottom
-                    field_height = self._calculate_element_height(field, 'field')
-                    prev_max_bottom = new_top + field_height
+                # Move them all in one batch, tables first then fields
+                for element, _ in items_to_move:
+                    element.extract()
+                prev_bill_content.extend([element for element, _ in items_to_move])
             
             # Move bill-footer to previous page
             if last_bill_footer:
@@ -500,61 +615,92 @@ class HtmlOrganizer:
                     footer_style = f'{footer_style}; position: relative;'
                 last_bill_footer['style'] = footer_style
                 prev_page.append(last_bill_footer)
+                last_meta['footer'] = None
+                if prev_meta['footer'] is None:
+                    prev_meta['footer'] = last_bill_footer
     
-    def _calculate_page_content_height(self, bill_content) -> float:
+    def _calculate_page_content_height(
+        self, bill_content, height_cache: Dict[int, Tuple[Any, str, float]]
+    ) -> float:
         """
         Calculate total height of all content in bill-content section.
         """
         if not bill_content:
             return 0
         
+        # One walk over the subtree, classifying tables and fields as we go
         max_bottom = 0
-        tables = bill_content.find_all('div', class_='bill-content-table')
-        fields = bill_content.find_all('div', class_='field')
-        
-        for table in tables:
-            table_top = self._get_top_from_style(table.get('style', ''))
-            table_height = self._calculate_element_height(table, 'table')
-            max_bottom = max(max_bottom, table_top + table_height)
-        
-        for field in fields:
-            field_top = self._get_top_from_style(field.get('style', ''))
-            field_height = self._calculate_element_height(field, 'field')
-            max_bottom = max(max_bottom, field_top + field_height)
+        for element in bill_content.descendants:
+            if element.name != 'div':
+                continue
+            classes = element.get('class') or ()
+            is_table = 'bill-content-table' in classes
+            is_field = 'field' in classes
+            if not (is_table or is_field):
+                continue
+            top = self._get_top_from_style(element.get('style', ''))
+            if is_table:
+                max_bottom = max(max_bottom, top + self._calculate_element_height(element, 'table', height_cache))
+            if is_field:
+                max_bottom = max(max_bottom, top + self._calculate_element_height(element, 'field', height_cache))
         
         return max_bottom
     
-    def _get_max_bottom(self, bill_content) -> float:
+    def _split_content_elements(self, bill_content) -> Tuple[List, List]:
         """
-        Get the maximum bottom position of all elements in bill-content.
+        Collect the table and field divs under bill-content in a single walk.
+        
+        Returns:
+            (tables, fields), each in document order
+        """
+        tables = []
+        fields = []
+        for element in bill_content.descendants:
+            if element.name != 'div':
+                continue
+            classes = element.get('class') or ()
+            if 'bill-content-table' in classes:
+                tables.append(element)
+            if 'field' in classes:
+                fields.append(element)
+        return tables, fields
+    
+    def _has_content_elements(self, bill_content) -> bool:
+        """
+        Check whether bill-content holds any table or field div, stopping at the first.
         """
-        return self._calculate_page_content_height(bill_content)
+        for element in bill_content.descendants:
+            if element.name != 'div':
+                continue
+            classes = element.get('class') or ()
+            if 'bill-content-table' in classes or 'field' in classes:
+                return True
+        return False
     
-    def _fix_bill_content_positioning(self, bill_pages: List):
+    def _fix_bill_content_positioning(self, page_meta: List[Dict[str, Any]]):
         """
         Convert all bill-content child elements from absolute to relative positioning.
         Remove 'top' positioning, keep only 'left' (x-axis).
         """
-        for page in bill_pages:
-            bill_content = page.find('div', class_='bill-content')
+        for meta in page_meta:
+            bill_content = meta['content']
             if not bill_content:
                 continue
             
             # Get all child elements (tables and fields)
-            tables = bill_content.find_all('div', class_='bill-content-table')
-            fields = bill_content.find_all('div', class_='field')
+            tables, fields = self._split_content_elements(bill_content)
             
             for element in tables + fields:
                 style = element.get('style', '')
                 # Extract left value if exists
-                left_match = re.search(r'left:\s*(\d+\.?\d*)px', style)
+                left_match = _RE_LEFT.search(style)
                 left_value = left_match.group(1) if left_match else None
                 
                 # Remove position: absolute and top
-                new_style = re.sub(r'position:\s*absolute;?\s*', '', style)
-                new_style = re.sub(r'position:\s*absolute\s*', '', new_style)
-                new_style = re.sub(r'top:\s*\d+\.?\d*px;?\s*', '', new_style)
-                new_style = re.sub(r'top:\s*\d+\.?\d*px\s*', '', new_style)
+                new_style = _RE_POSITION_ABSOLUTE.sub('', style)
+                new_style = _RE_POSITION_ABSOLUTE_TRAILING.sub('', new_style)
+                new_style = _RE_TOP_DECL.sub('', new_style)
+                new_style = _RE_TOP_DECL_TRAILING.sub('', new_style)
                 
                 # Set position relative and keep left if it exists
                 if left_value:
@@ -563,30 +709,30 @@ class HtmlOrganizer:
                     new_style = f'position: relative; {new_style}'.strip()
                 
                 # Clean up extra semicolons and spaces
-                new_style = re.sub(r';\s*;+', ';', new_style)
-                new_style = re.sub(r'^\s*;\s*', '', new_style)
-                new_style = re.sub(r'\s+', ' ', new_style).strip()
+                new_style = _RE_REPEATED_SEMICOLONS.sub(';', new_style)
+                new_style = _RE_LEADING_SEMICOLON.sub('', new_style)
+                new_style = _RE_WHITESPACE.sub(' ', new_style).strip()
                 
                 element['style'] = new_style
     
-    def _fix_bill_footer_positioning(self, bill_pages: List):
+    def _fix_bill_footer_positioning(self, page_meta: List[Dict[str, Any]]):
         """
         Fix bill-footer positioning: remove top/absolute positioning.
         Ensure bill-footer appears before page-footer in DOM order.
         """
-        for page in bill_pages:
-            bill_footer = page.find('div', class_='bill-footer')
-            page_footer = page.find('div', class_='page-footer')
+        for meta in page_meta:
+            bill_footer = meta['footer']
+            page_footer = meta['page_footer']
             
             if bill_footer:
                 # Remove top and position absolute from bill-footer style
                 style = bill_footer.get('style', '')
-                new_style = re.sub(r'top:\s*\d+\.?\d*px;?\s*', '', style)
-                new_style = re.sub(r'position:\s*absolute;?\s*', '', new_style)
-                new_style = re.sub(r'position:\s*absolute\s*', '', new_style)
-                new_style = re.sub(r';\s*;+', ';', new_style)
-                new_style = re.sub(r'^\s*;\s*', '', new_style)
-                new_style = re.sub(r'\s+', ' ', new_style).strip()
+                new_style = _RE_TOP_DECL.sub('', style)
+                new_style = _RE_POSITION_ABSOLUTE.sub('', new_style)
+                new_style = _RE_POSITION_ABSOLUTE_TRAILING.sub('', new_style)
+                new_style = _RE_REPEATED_SEMICOLONS.sub(';', new_style)
+                new_style = _RE_LEADING_SEMICOLON.sub('', new_style)
+                new_style = _RE_WHITESPACE.sub(' ', new_style).strip()
                 
                 if new_style:
                     bill_footer['style'] = new_style
@@ -613,39 +759,31 @@ class HtmlOrganizer:
                     else:
                         # Different parents - move to same parent as page-footer if needed
                         # Usually both should be direct children of bill-container
-                        bill_container = page.find('div', class_='bill-container')
+                        bill_container = meta['container']
                         if bill_container and page_footer.parent == bill_container:
                             if bill_footer.parent != bill_container:
                                 bill_footer.extract()
                                 page_footer.insert_before(bill_footer)
     
-    def _remove_empty_pages(self, bill_pages: List):
+    def _remove_empty_pages(self, page_meta: List[Dict[str, Any]]):
         """
         Remove pages that only contain page-header and page-footer (no bill-content or bill-footer).
         """
         pages_to_remove = []
         
-        for page in bill_pages:
-            bill_content = page.find('div', class_='bill-content')
-            bill_footer = page.find('div', class_='bill-footer')
-            bill_header = page.find('div', class_='bill-header')
-            
-            # Check if page has meaningful content
-            has_content = False
-            
-            if bill_content:
-                # Check if bill-content has actual content (tables or fields)
-                tables = bill_content.find_all('div', class_='bill-content-table')
-                fields = bill_content.find_all('div', class_='field')
-                if tables or fields:
-                    has_content = True
-            
-            if bill_footer or bill_header:
-                has_content = True
+        for meta in page_meta:
+            # Check if page has meaningful content: a bill-footer/bill-header,
+            # or a bill-content holding actual tables or fields (checked last,
+            # as it is the only one that needs a walk)
+            has_content = (
+                meta['footer'] is not None
+                or meta['header'] is not None
+                or (meta['content'] is not None and self._has_content_elements(meta['content']))
+            )
             
             # If no content, mark for removal
             if not has_content:
-                pages_to_remove.append(page)
+                pages_to_remove.append(meta['page'])
         
         # Remove empty pages
         for page in pages_to_remove:
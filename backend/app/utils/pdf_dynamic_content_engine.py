@@ -10,8 +10,12 @@ Core Principles:
 """
 
 from reportlab.pdfgen import canvas
-from typing import Dict, Any, List
+from functools import lru_cache
+from operator import itemgetter
+from typing import Dict, Any, List, Tuple
+import ast
 import logging
+import re
 
 from .pdf_field_renderer import render_field, get_field_value
 from .pdf_table_renderer import (
@@ -22,6 +26,145 @@ from .pdf_table_renderer import (
 
 logger = logging.getLogger(__name__)
 
+# Formula patterns, compiled once (final-row formulas are evaluated per render)
+_NUMBER_RE = re.compile(r'\s*(?:(?:0|[1-9]\d*)(?:\.\d*)?|\.\d+)\s*')
+_AGG_RES = [
+    (re.compile(r'sum\(([^)]+)\)', re.IGNORECASE), 'sum'),
+    (re.compile(r'avg\(([^)]+)\)', re.IGNORECASE), 'avg'),
+    (re.compile(r'count\(([^)]+)\)', re.IGNORECASE), 'count'),
+    (re.compile(r'min\(([^)]+)\)', re.IGNORECASE), 'min'),
+    (re.compile(r'max\(([^)]+)\)', re.IGNORECASE), 'max'),
+]
+
+
+@lru_cache(maxsize=512)
+def _header_re(key: str) -> re.Pattern:
+    """Compiled pattern matching a header.<key> reference in a formula."""
+    return re.compile(rf'\bheader\.{re.escape(key)}\b', re.IGNORECASE)
+
+
+# Functions a formula may call; nothing else (no builtins) is reachable
+_FORMULA_FUNCTIONS = {
+    'abs': abs,
+    'round': round,
+    'int': int,
+    'float': float,
+    'min': min,
+    'max': max,
+}
+# Globals for evaluating compiled formulas (empty __builtins__ blocks the rest)
+_FORMULA_GLOBALS = {'__builtins__': {}, **_FORMULA_FUNCTIONS}
+_FORMULA_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.IfExp, ast.Compare, ast.Call,
+    ast.Constant, ast.Name, ast.Load,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+    ast.UAdd, ast.USub, ast.Not, ast.And, ast.Or,
+    ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE,
+)
+# Largest literal exponent allowed in "x ** n" (a huge one would stall the render)
+_MAX_LITERAL_EXPONENT = 100
+_FIELD_PREFIX = '_f_'
+
+
+class _ItemFieldRewriter(ast.NodeTransformer):
+    """Turn items.<field> references into plain names (_f_<field>)."""
+    
+    def __init__(self):
+        self.fields = {}
+    
+    def visit_Attribute(self, node):
+        if isinstance(node.value, ast.Name) and node.value.id.lower() == 'items':
+            name = _FIELD_PREFIX + node.attr
+            self.fields[name] = node.attr
+            return ast.copy_location(ast.Name(id=name, ctx=ast.Load()), node)
+        return self.generic_visit(node)
+
+
+def _check_exponent(exponent: ast.AST) -> None:
+    """
+    Reject exponents that could make "x ** n" run away.
+    
+    Raises:
+        ValueError: If the exponent is a literal above _MAX_LITERAL_EXPONENT
+            or itself contains a power (e.g. 9 ** 9 ** 9)
+    """
+    literal = exponent.operand if isinstance(exponent, ast.UnaryOp) else exponent
+    if (isinstance(literal, ast.Constant) and isinstance(literal.value, (int, float))
+            and abs(literal.value) > _MAX_LITERAL_EXPONENT):
+        raise ValueError(f"Exponent too large in formula: {literal.value!r}")
+    for node in ast.walk(exponent):
+        if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Pow):
+            raise ValueError("Nested exponent in formula")
+
+
+def _build_expression(expr: str) -> Tuple[Any, Tuple[Tuple[str, str], ...]]:
+    """
+    Parse, validate and compile an arithmetic formula expression.
+    
+    Only numbers, arithmetic/comparison/boolean operators, conditional
+    expressions, items.<field> references and the functions in
+    _FORMULA_FUNCTIONS are accepted.
+    
+    Args:
+        expr: Expression like "items.quantity * items.price" or "150.0 * 1.5"
+        
+    Returns:
+        (code object, ((variable name, field name), ...)); evaluate the code
+        with eval(code, _FORMULA_GLOBALS, {variable name: item value})
+        
+    Raises:
+        SyntaxError: If the expression does not parse
+        ValueError: If the expression uses anything outside the whitelist
+    """
+    rewriter = _ItemFieldRewriter()
+    tree = rewriter.visit(ast.parse(expr.strip(), mode='eval'))
+    for node in ast.walk(tree):
+        if not isinstance(node, _FORMULA_NODES):
+            raise ValueError(f"Unsupported syntax in formula: {type(node).__name__}")
+        if isinstance(node, ast.Name) and node.id not in rewriter.fields and node.id not in _FORMULA_FUNCTIONS:
+            raise ValueError(f"Unknown name in formula: {node.id}")
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)):
+            raise ValueError(f"Unsupported constant in formula: {node.value!r}")
+        if isinstance(node, ast.Call) and (
+            not isinstance(node.func, ast.Name) or node.func.id not in _FORMULA_FUNCTIONS or node.keywords
+        ):
+            raise ValueError("Unsupported function call in formula")
+        if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Pow):
+            _check_exponent(node.right)
+    code = compile(tree, '<formula>', 'eval')
+    return code, tuple(rewriter.fields.items())
+
+
+@lru_cache(maxsize=256)
+def _compile_expression(expr: str) -> Tuple[Any, Tuple[Tuple[str, str], ...]]:
+    """
+    _build_expression, cached for the expressions written in templates
+    (e.g. the per-item expression inside an aggregate).
+    
+    Fully substituted formulas carry each render's numbers and are never
+    repeated, so they go through _build_expression directly instead.
+    """
+    return _build_expression(expr)
+
+
+def bill_content_table_key(table_config: Dict[str, Any]) -> Tuple[Any, ...]:
+    """Cursor state key of a billContentTable (tables are identified by position)."""
+    return ('billContentTable', table_config.get('x', 0), table_config.get('y', 0))
+
+
+def content_detail_table_key(content_name: Any, table_config: Dict[str, Any]) -> Tuple[Any, ...]:
+    """Cursor state key of a contentDetailTable."""
+    return ('contentDetailTable', content_name, table_config.get('x', 0), table_config.get('y', 0))
+
+
+def _fmt_num(x: float) -> str:
+    """Format a numeric cell value: whole numbers without decimals, others to 2 places."""
+    try:
+        i = int(x)
+    except (OverflowError, ValueError):  # inf / nan
+        return "%.2f" % x
+    return str(i) if i == x else "%.2f" % x
+
 
 def _calculate_final_row_value(
     cell_config: Dict[str, Any], 
@@ -67,14 +210,21 @@ def _calculate_final_row_value(
         if not source_data:
             return ''
         
-        # Extract values from source data
+        # Extract values from source data (rows are dicts; the type is only
+        # checked per row if one turns out not to be)
+        if '.' not in calculation_field:
+            try:
+                raw_values = [item.get(calculation_field) for item in source_data]
+            except AttributeError:
+                raw_values = [
+                    item.get(calculation_field) if isinstance(item, dict) else None
+                    for item in source_data
+                ]
+        else:
+            raw_values = [get_field_value(calculation_field, item) for item in source_data]
+        
         values = []
-        for item in source_data:
-            if '.' not in calculation_field:
-                value = item.get(calculation_field) if isinstance(item, dict) else None
-            else:
-                value = get_field_value(calculation_field, item)
-            
+        for value in raw_values:
             if value is not None:
                 try:
                     numeric_value = float(value)
@@ -100,19 +250,20 @@ def _calculate_final_row_value(
             return ''
         
         # Format result (handle decimals)
-        if calculation_type in ['sum', 'avg', 'min', 'max']:
-            if result.is_integer():
-                return str(int(result))
-            else:
-                return f"{result:.2f}"
-        else:
-            return str(int(result))
+        return _fmt_num(result)
     
     elif value_type == 'formula':
         formula = cell_config.get('formula', '')
-        if not formula:
+        # Non-string formulas (e.g. a bare number in the template JSON)
+        # render an empty cell
+        if not formula or not isinstance(formula, str) or formula.isspace():
             return ''
         
+        # A plain number needs no aggregates, header lookups or evaluation
+        if _NUMBER_RE.fullmatch(formula):
+            number = formula.strip()
+            return _fmt_num(float(number) if '.' in number else int(number))
+        
         """
         Formula Evaluation Examples:
         
@@ -143,34 +294,31 @@ def _calculate_final_row_value(
            "sum(items.total) * (1 + header.taxRate / 100)"
         """
         try:
-            import re
             formula_original = formula
-            formula_lower = formula.lower()
             
-            logger.info(f"Evaluating formula: '{formula_original}'")
-            logger.debug(f"  Items count: {len(all_items) if all_items else 0}")
-            logger.debug(f"  ContentDetails available: {list(data.get('contentDetails', {}).keys()) if data.get('contentDetails') else 'none'}")
+            # Debug messages below are only built when DEBUG is enabled
+            debug = logger.isEnabledFor(logging.DEBUG)
+            
+            logger.info("Evaluating formula: '%s'", formula_original)
+            if debug:
+                logger.debug(f"  Items count: {len(all_items) if all_items else 0}")
+                logger.debug(f"  ContentDetails available: {list(data.get('contentDetails', {}).keys()) if data.get('contentDetails') else 'none'}")
             
-            # Helper function to get source data
-            def get_source_data(source_path: str):
-                """Get data source based on path like 'items', 'contentDetails.payments', etc."""
-                if source_path == 'items' or source_path.startswith('items.'):
-                    return all_items
-                elif source_path.startswith('contentDetails.'):
-                    parts = source_path.replace('contentDetails.', '').split('.')
-                    content_name = parts[0]
-                    content_details = data.get('contentDetails', {})
-                    if content_name in content_details:
-                        cd_data = content_details[content_name]
-                        if isinstance(cd_data, list):
-                            return cd_data
-                return []
+            # contentDetails lists usable as aggregate sources, resolved once
+            content_details = data.get('contentDetails') or {}
+            content_sources = {
+                name: cd_data for name, cd_data in content_details.items() if isinstance(cd_data, list)
+            }
             
             # Helper function to extract field value from item
             def extract_field_value(item: dict, field_path: str) -> float:
                 """Extract numeric value from item using field path."""
                 if '.' not in field_path:
-                    value = item.get(field_path) if isinstance(item, dict) else None
+                    try:
+                        value = item.get(field_path)
+                    except AttributeError:
+                        # Not a dict row
+                        value = None
                 else:
                     value = get_field_value(field_path, item)
                 
@@ -185,138 +333,145 @@ def _calculate_final_row_value(
             def evaluate_field_expression(item: dict, expr: str) -> float:
                 """Evaluate expression like 'items.quantity * items.price' for a single item."""
                 try:
-                    # Replace field references with actual values
-                    expr_eval = expr
-                    # Handle items.fieldName pattern
-                    field_pattern = r'items\.(\w+)'
-                    for match in re.finditer(field_pattern, expr_eval, re.IGNORECASE):
-                        field_name = match.group(1)
-                        field_value = extract_field_value(item, field_name)
-                        expr_eval = expr_eval.replace(match.group(0), str(field_value))
-                    # Evaluate the expression
-                    return float(eval(expr_eval))
-                except:
+                    # Bind each items.fieldName reference to the item's value
+                    code, fields = _compile_expression(expr)
+                    names = {name: extract_field_value(item, field_name) for name, field_name in fields}
+                    return float(eval(code, _FORMULA_GLOBALS, names))
+                except Exception:
                     return 0.0
             
             # Process aggregate functions: sum(), avg(), count(), min(), max()
-            aggregate_patterns = [
-                (r'sum\(([^)]+)\)', 'sum'),
-                (r'avg\(([^)]+)\)', 'avg'),
-                (r'count\(([^)]+)\)', 'count'),
-                (r'min\(([^)]+)\)', 'min'),
-                (r'max\(([^)]+)\)', 'max'),
-            ]
-            
-            for pattern, func_name in aggregate_patterns:
-                for match in re.finditer(pattern, formula_lower, re.IGNORECASE):
+            # First resolve every call's source and the values it needs, so
+            # each source is read in one pass however many calls share it
+            aggregates = []
+            source_values = {}  # source_type -> (source_data, {(is_expression, expr): values})
+            # Every aggregate call needs a '(' - skip the scans when there is none
+            for pattern, func_name in (_AGG_RES if '(' in formula else ()):
+                for match in pattern.finditer(formula):
                     expr = match.group(1).strip()
+                    expr_lower = expr.lower()
                     original_match = match.group(0)
                     
-                    logger.debug(f"Evaluating {func_name.upper()} function: {original_match} (expression: {expr})")
+                    if debug:
+                        logger.debug(f"Evaluating {func_name.upper()} function: {original_match} (expression: {expr})")
                     
                     # Determine source data
                     source_data = []
                     field_expr = expr
                     source_type = 'unknown'
                     
-                    if expr.startswith('items.'):
+                    # Prefixes match in any case; field and content names keep theirs
+                    if expr_lower.startswith('items.'):
                         source_data = all_items
-                        field_expr = expr.replace('items.', '')
+                        field_expr = expr[len('items.'):]
                         source_type = 'items'
-                        logger.debug(f"  Source: items, field: {field_expr}, items count: {len(source_data)}")
-                    elif expr.startswith('contentDetails.'):
+                        if debug:
+                            logger.debug(f"  Source: items, field: {field_expr}, items count: {len(source_data)}")
+                    elif expr_lower.startswith('contentdetails.'):
                         # Extract content name and field
-                        parts = expr.replace('contentDetails.', '').split('.', 1)
+                        parts = expr[len('contentDetails.'):].split('.', 1)
                         content_name = parts[0]
                         field_expr = parts[1] if len(parts) > 1 else ''
                         source_type = f'contentDetails.{content_name}'
-                        content_details = data.get('contentDetails', {})
-                        if content_name in content_details:
-                            cd_data = content_details[content_name]
-                            if isinstance(cd_data, list):
-                                source_data = cd_data
+                        if content_name in content_sources:
+                            source_data = content_sources[content_name]
+                            if debug:
                                 logger.debug(f"  Source: contentDetails.{content_name}, field: {field_expr}, items count: {len(source_data)}")
-                            else:
-                                logger.warning(f"  contentDetails.{content_name} is not a list, got {type(cd_data)}")
+                        elif content_name in content_details:
+                            logger.warning(f"  contentDetails.{content_name} is not a list, got {type(content_details[content_name])}")
                         else:
                             logger.warning(f"  contentDetails.{content_name} not found in data")
-                    elif expr == 'items':
+                    elif expr_lower == 'items':
                         # count(items) - just count the items
                         source_data = all_items
                         field_expr = None
                         source_type = 'items'
-                        logger.debug(f"  Source: items (count only), items count: {len(source_data)}")
+                        if debug:
+                            logger.debug(f"  Source: items (count only), items count: {len(source_data)}")
                     else:
                         # Default to items
                         source_data = all_items
                         field_expr = expr.replace('items.', '') if 'items.' in expr else expr
                         source_type = 'items'
-                        logger.debug(f"  Source: items (default), field: {field_expr}, items count: {len(source_data)}")
-                    
-                    if not source_data:
-                        logger.warning(f"  No source data found for {func_name}({expr}), replacing with 0")
-                        formula = formula.replace(original_match, '0', 1)
-                        continue
+                        if debug:
+                            logger.debug(f"  Source: items (default), field: {field_expr}, items count: {len(source_data)}")
                     
-                    # Calculate aggregate value
-                    if func_name == 'count' and field_expr is None:
-                        # count(items) - just return count
-                        agg_value = len(source_data)
-                        logger.info(f"  {func_name.upper()}({expr}) = {agg_value} (count of {len(source_data)} items)")
-                    else:
-                        # Extract values
-                        values = []
+                    values_key = None
+                    if source_data and field_expr is not None:
                         has_expression = '*' in field_expr or '+' in field_expr or '-' in field_expr or '/' in field_expr
-                        
-                        if has_expression:
-                            logger.debug(f"  Evaluating expression for each item: {expr}")
-                        
-                        for idx, item in enumerate(source_data):
-                            try:
-                                if has_expression:
-                                    # Expression like "items.quantity * items.price"
-                                    value = evaluate_field_expression(item, expr)
-                                    if idx < 3:  # Log first 3 items for debugging
-                                        logger.debug(f"    Item[{idx}]: {expr} = {value}")
-                                else:
-                                    # Simple field reference
-                                    value = extract_field_value(item, field_expr)
-                                    if idx < 3:  # Log first 3 items for debugging
-                                        logger.debug(f"    Item[{idx}]: {field_expr} = {value}")
-                                
-                                if value is not None:
-                                    values.append(value)
-                            except Exception as e:
-                                logger.warning(f"    Error extracting value from item[{idx}]: {str(e)}")
-                                continue
-                        
-                        if not values:
-                            agg_value = 0
-                            logger.warning(f"  No valid values extracted for {func_name}({expr}), result: 0")
-                        elif func_name == 'sum':
-                            agg_value = sum(values)
-                            logger.info(f"  SUM({expr}) = {agg_value} (sum of {len(values)} values: {values[:5]}{'...' if len(values) > 5 else ''})")
-                        elif func_name == 'avg':
-                            agg_value = sum(values) / len(values) if values else 0
-                            logger.info(f"  AVG({expr}) = {agg_value:.2f} (average of {len(values)} values)")
-                        elif func_name == 'count':
-                            agg_value = len(values)
-                            logger.info(f"  COUNT({expr}) = {agg_value} (count of {len(values)} non-null values)")
-                        elif func_name == 'min':
-                            agg_value = min(values)
-                            logger.info(f"  MIN({expr}) = {agg_value} (minimum of {len(values)} values)")
-                        elif func_name == 'max':
-                            agg_value = max(values)
-                            logger.info(f"  MAX({expr}) = {agg_value} (maximum of {len(values)} values)")
-                        else:
-                            agg_value = 0
-                            logger.warning(f"  Unknown aggregate function: {func_name}")
+                        # Expressions like "items.quantity * items.price" are evaluated per item
+                        values_key = (True, expr) if has_expression else (False, field_expr)
+                        wanted = source_values.setdefault(source_type, (source_data, {}))[1]
+                        wanted.setdefault(values_key, [])
                     
-                    # Replace in formula (use original case)
-                    original_formula_match = re.search(pattern, formula, re.IGNORECASE)
-                    if original_formula_match:
-                        formula_before = formula
-                        formula = formula.replace(original_formula_match.group(0), str(agg_value), 1)
+                    aggregates.append((pattern, func_name, expr, source_type, source_data, values_key))
+            
+            # Extract values: one pass per source, every needed field per item
+            for source_type, (source_data, wanted) in source_values.items():
+                for idx, item in enumerate(source_data):
+                    for (is_expression, text), values in wanted.items():
+                        try:
+                            if is_expression:
+                                value = evaluate_field_expression(item, text)
+                            else:
+                                # Simple field reference
+                                value = extract_field_value(item, text)
+                            if debug and idx < 3:  # Log first 3 items for debugging
+                                logger.debug(f"    {source_type}[{idx}]: {text} = {value}")
+                            
+                            if value is not None:
+                                values.append(value)
+                        except Exception as e:
+                            logger.warning(f"    Error extracting value from item[{idx}]: {str(e)}")
+            
+            # Aggregate results per pattern, in match order
+            substitutions = {}
+            for pattern, func_name, expr, source_type, source_data, values_key in aggregates:
+                if not source_data:
+                    logger.warning(f"  No source data found for {func_name}({expr}), replacing with 0")
+                    substitutions.setdefault(pattern, []).append('0')
+                    continue
+                
+                # Calculate aggregate value
+                if func_name == 'count' and values_key is None:
+                    # count(items) - just return count
+                    agg_value = len(source_data)
+                    logger.info("  %s(%s) = %s (count of %d items)", func_name.upper(), expr, agg_value, len(source_data))
+                else:
+                    values = source_values[source_type][1][values_key]
+                    
+                    if not values:
+                        agg_value = 0
+                        logger.warning(f"  No valid values extracted for {func_name}({expr}), result: 0")
+                    elif func_name == 'sum':
+                        agg_value = sum(values)
+                        logger.info("  SUM(%s) = %s (sum of %d values)", expr, agg_value, len(values))
+                    elif func_name == 'avg':
+                        agg_value = sum(values) / len(values) if values else 0
+                        logger.info("  AVG(%s) = %.2f (average of %d values)", expr, agg_value, len(values))
+                    elif func_name == 'count':
+                        agg_value = len(values)
+                        logger.info("  COUNT(%s) = %s (count of %d non-null values)", expr, agg_value, len(values))
+                    elif func_name == 'min':
+                        agg_value = min(values)
+                        logger.info("  MIN(%s) = %s (minimum of %d values)", expr, agg_value, len(values))
+                    elif func_name == 'max':
+                        agg_value = max(values)
+                        logger.info("  MAX(%s) = %s (maximum of %d values)", expr, agg_value, len(values))
+                    else:
+                        agg_value = 0
+                        logger.warning(f"  Unknown aggregate function: {func_name}")
+                
+                substitutions.setdefault(pattern, []).append(str(agg_value))
+            
+            # Replace each call with its result, one sub per function, in the
+            # same order (sum first) so nested calls resolve as before
+            for pattern, _ in _AGG_RES:
+                if pattern in substitutions:
+                    results = iter(substitutions[pattern])
+                    formula_before = formula
+                    formula = pattern.sub(lambda m: next(results, m.group(0)), formula)
+                    if debug:
                         logger.debug(f"  Formula updated: {formula_before} -> {formula}")
             
             # Replace header references
@@ -326,13 +481,8 @@ def _calculate_final_row_value(
                 for key, value in header.items():
                     # Replace both header.key and header.key patterns
                     formula_before = formula
-                    formula = re.sub(
-                        rf'\bheader\.{re.escape(key)}\b',
-                        str(value),
-                        formula,
-                        flags=re.IGNORECASE
-                    )
-                    if formula_before != formula:
+                    formula = _header_re(key).sub(str(value), formula)
+                    if debug and formula_before != formula:
                         header_replacements[f'header.{key}'] = value
                 
                 if header_replacements:
@@ -340,17 +490,12 @@ def _calculate_final_row_value(
                     logger.debug(f"  Formula after header replacement: {formula}")
             
             # Evaluate the final numeric expression
-            logger.debug(f"  Final formula to evaluate: {formula}")
-            result = eval(formula)
+            if debug:
+                logger.debug(f"  Final formula to evaluate: {formula}")
+            result = eval(_build_expression(formula)[0], _FORMULA_GLOBALS)
+            final_result = _fmt_num(result) if isinstance(result, float) else str(result)
             
-            if isinstance(result, float) and result.is_integer():
-                final_result = str(int(result))
-            elif isinstance(result, float):
-                final_result = f"{result:.2f}"
-            else:
-                final_result = str(result)
-            
-            logger.info(f"Formula evaluation complete: '{formula_original}' = {final_result}")
+            logger.info("Formula evaluation complete: '%s' = %s", formula_original, final_result)
             return final_result
         except Exception as e:
             logger.warning(f"Error evaluating formula '{formula}': {str(e)}")
@@ -441,7 +586,7 @@ class DynamicContentRenderEngine:
                 })
         
         # Sort by Y position (ascending = top to bottom)
-        elements.sort(key=lambda e: e.get('y', 0))
+        elements.sort(key=itemgetter('y'))
         
         return elements
     
@@ -449,7 +594,7 @@ class DynamicContentRenderEngine:
         self, c: canvas.Canvas, element: Dict[str, Any],
         element_y: float, min_content_y: float,
         page_num: int, page_context: Dict[str, Any], data: Dict[str, Any],
-        template_config: Dict[str, Any], cursor_state: Dict[str, Any]
+        template_config: Dict[str, Any], cursor_state: Dict[Tuple[Any, ...], Any]
     ) -> Dict[str, Any]:
         """
         Render a single content element (field or table).
@@ -506,23 +651,19 @@ class DynamicContentRenderEngine:
         self, c: canvas.Canvas, element: Dict[str, Any],
         element_y: float, min_content_y: float,
         page_num: int, page_context: Dict[str, Any], data: Dict[str, Any],
-        cursor_state: Dict[str, Any]
+        cursor_state: Dict[Tuple[Any, ...], Any]
     ) -> Dict[str, Any]:
         """Render billContentTable with cursor state management."""
         table_config = element['config']
         items = element.get('data', [])
         
-        # Initialize state if not exists
-        table_key = f"billContentTable_{table_config.get('x', 0)}_{table_config.get('y', 0)}"
-        if table_key not in cursor_state:
-            cursor_state[table_key] = {
-                'last_index': -1,
-                'final_rows_rendered': False,
-                'all_rows_rendered': False
-            }
-        
-        # Get current state
-        state = cursor_state[table_key]
+        # Get the table's cursor state, initializing it on first render
+        table_key = bill_content_table_key(table_config)
+        state = cursor_state.setdefault(table_key, {
+            'last_index': -1,
+            'final_rows_rendered': False,
+            'all_rows_rendered': False
+        })
         current_last_index = state.get('last_index', -1)
         total_items = len(items) if items else 0
         
@@ -632,30 +773,24 @@ class DynamicContentRenderEngine:
         self, c: canvas.Canvas, element: Dict[str, Any],
         element_y: float, min_content_y: float,
         page_num: int, page_context: Dict[str, Any], data: Dict[str, Any],
-        cursor_state: Dict[str, Any]
+        cursor_state: Dict[Tuple[Any, ...], Any]
     ) -> Dict[str, Any]:
         """Render contentDetailTable with cursor state management."""
         table_config = element['config']
         cd_data = element.get('data', [])
         content_name = element.get('content_name')
         
-        # Initialize state if not exists
-        content_table_key = f"contentDetailTable_{content_name}_{table_config.get('x', 0)}_{table_config.get('y', 0)}"
-        
-        if content_table_key not in cursor_state:
-            actual_data_length = len(cd_data) if cd_data else 0
-            cursor_state[content_table_key] = {
-                'last_index': -1,
-                'final_rows_rendered': False,
-                'all_rows_rendered': False,
-                'content_name': content_name,
-                'table_config': table_config,
-                'items': cd_data,
-                'total_items': actual_data_length
-            }
-        
-        # Get current state
-        state = cursor_state[content_table_key]
+        # Get the table's cursor state, initializing it on first render
+        content_table_key = content_detail_table_key(content_name, table_config)
+        state = cursor_state.setdefault(content_table_key, {
+            'last_index': -1,
+            'final_rows_rendered': False,
+            'all_rows_rendered': False,
+            'content_name': content_name,
+            'table_config': table_config,
+            'items': cd_data,
+            'total_items': len(cd_data) if cd_data else 0
+        })
         current_last_index = state.get('last_index', -1)
         total_items = state.get('total_items', len(cd_data) if cd_data else 0)
         
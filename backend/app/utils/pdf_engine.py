@@ -11,6 +11,7 @@ This engine enforces:
 
 from reportlab.pdfgen import canvas
 from io import BytesIO
+from operator import itemgetter
 from typing import Dict, Any, List, Tuple, Optional
 import json
 import logging
@@ -25,7 +26,11 @@ from .pdf_table_renderer import (
     calculate_cell_height
 )
 from .pdf_fixed_content_engine import FixedContentRenderEngine
-from .pdf_dynamic_content_engine import DynamicContentRenderEngine
+from .pdf_dynamic_content_engine import (
+    DynamicContentRenderEngine,
+    bill_content_table_key,
+    content_detail_table_key
+)
 from .pdf_page_balance_engine import PageBalanceFitEngine
 
 logger = logging.getLogger(__name__)
@@ -313,7 +318,7 @@ class PDFEngine:
     
     def _get_tables_needing_continuation(
         self, bill_content_elements: List[Dict[str, Any]],
-        table_rendering_state: Dict[str, Any], page_num: int
+        table_rendering_state: Dict[Tuple[Any, ...], Any], page_num: int
     ) -> List[Dict[str, Any]]:
         """
         Get tables that need continuation on the next page.
@@ -330,10 +335,10 @@ class PDFEngine:
                 items = element.get('data', [])
                 
                 if element['type'] == 'billContentTable':
-                    table_key = f"billContentTable_{table_config.get('x', 0)}_{table_config.get('y', 0)}"
+                    table_key = bill_content_table_key(table_config)
                 else:
                     content_name = element.get('content_name')
-                    table_key = f"contentDetailTable_{content_name}_{table_config.get('x', 0)}_{table_config.get('y', 0)}"
+                    table_key = content_detail_table_key(content_name, table_config)
                 
                 if table_key in table_rendering_state:
                     state = table_rendering_state[table_key]
@@ -351,7 +356,7 @@ class PDFEngine:
     
     def _get_tables_needing_continuation_with_order(
         self, bill_content_elements: List[Dict[str, Any]],
-        table_rendering_state: Dict[str, Any], page_num: int
+        table_rendering_state: Dict[Tuple[Any, ...], Any], page_num: int
     ) -> List[Dict[str, Any]]:
         """
         Get tables that need continuation, respecting sequential rendering order.
@@ -373,10 +378,10 @@ class PDFEngine:
             # Get table key for comparison
             table_config = table_element['config']
             if table_element['type'] == 'billContentTable':
-                current_table_key = f"billContentTable_{table_config.get('x', 0)}_{table_config.get('y', 0)}"
+                current_table_key = bill_content_table_key(table_config)
             else:
                 content_name = table_element.get('content_name')
-                current_table_key = f"contentDetailTable_{content_name}_{table_config.get('x', 0)}_{table_config.get('y', 0)}"
+                current_table_key = content_detail_table_key(content_name, table_config)
             
             # Check if all previous tables (by Y position) are complete
             can_render = True
@@ -389,10 +394,10 @@ class PDFEngine:
                 # Skip if this is the same table (compare by key instead of id)
                 element_table_config = element['config']
                 if element['type'] == 'billContentTable':
-                    element_table_key = f"billContentTable_{element_table_config.get('x', 0)}_{element_table_config.get('y', 0)}"
+                    element_table_key = bill_content_table_key(element_table_config)
                 else:
                     element_content_name = element.get('content_name')
-                    element_table_key = f"contentDetailTable_{element_content_name}_{element_table_config.get('x', 0)}_{element_table_config.get('y', 0)}"
+                    element_table_key = content_detail_table_key(element_content_name, element_table_config)
                 
                 if element_table_key == current_table_key:
                     continue
@@ -421,7 +426,7 @@ class PDFEngine:
         return tables_needing_continuation
     
     def _check_all_tables_complete(
-        self, table_rendering_state: Dict[str, Any], bill_content_elements: List[Dict[str, Any]]
+        self, table_rendering_state: Dict[Tuple[Any, ...], Any], bill_content_elements: List[Dict[str, Any]]
     ) -> bool:
         """
         Check if all tables in bill_content_elements are complete.
@@ -439,10 +444,10 @@ class PDFEngine:
         for element in table_elements:
             table_config = element['config']
             if element['type'] == 'billContentTable':
-                table_key = f"billContentTable_{table_config.get('x', 0)}_{table_config.get('y', 0)}"
+                table_key = bill_content_table_key(table_config)
             else:
                 content_name = element.get('content_name')
-                table_key = f"contentDetailTable_{content_name}_{table_config.get('x', 0)}_{table_config.get('y', 0)}"
+                table_key = content_detail_table_key(content_name, table_config)
             
             if table_key not in table_rendering_state:
                 # Table hasn't started yet - not complete
@@ -459,7 +464,7 @@ class PDFEngine:
         return True
     
     def _filter_elements_by_sequential_order(
-        self, page_elements: List[Dict[str, Any]], table_rendering_state: Dict[str, Any],
+        self, page_elements: List[Dict[str, Any]], table_rendering_state: Dict[Tuple[Any, ...], Any],
         bill_content_elements: List[Dict[str, Any]]
     ) -> List[Dict[str, Any]]:
         """
@@ -480,11 +485,11 @@ class PDFEngine:
             current_table_key = None
             if element_type == 'billContentTable':
                 table_config = element['config']
-                current_table_key = f"billContentTable_{table_config.get('x', 0)}_{table_config.get('y', 0)}"
+                current_table_key = bill_content_table_key(table_config)
             elif element_type == 'contentDetailTable':
                 table_config = element['config']
                 content_name = element.get('content_name')
-                current_table_key = f"contentDetailTable_{content_name}_{table_config.get('x', 0)}_{table_config.get('y', 0)}"
+                current_table_key = content_detail_table_key(content_name, table_config)
             
             # Check if all previous tables (in original bill_content_elements order) are complete
             # CRITICAL: An element (table or field) can render if all previous tables (by Y order) that have been started are complete.
@@ -505,10 +510,10 @@ class PDFEngine:
                 # Get previous table key for comparison
                 prev_table_config = prev_element['config']
                 if prev_element['type'] == 'billContentTable':
-                    prev_table_key = f"billContentTable_{prev_table_config.get('x', 0)}_{prev_table_config.get('y', 0)}"
+                    prev_table_key = bill_content_table_key(prev_table_config)
                 else:
                     prev_content_name = prev_element.get('content_name')
-                    prev_table_key = f"contentDetailTable_{prev_content_name}_{prev_table_config.get('x', 0)}_{prev_table_config.get('y', 0)}"
+                    prev_table_key = content_detail_table_key(prev_content_name, prev_table_config)
                 
                 # Skip if this is the same table element (compare by key)
                 # For fields (current_table_key is None), check all previous tables
@@ -649,7 +654,7 @@ class PDFEngine:
                 })
         
         # Sort by Y position (ascending = top to bottom)
-        elements.sort(key=lambda e: e.get('y', 0))
+        elements.sort(key=itemgetter('y'))
         
         return elements
     
@@ -1009,7 +1014,7 @@ class PDFEngine:
         template_config: Dict[str, Any], data: Dict[str, Any],
         section_heights: Dict[str, float], page_width: float, page_height: float,
         bill_content_elements: List[Dict[str, Any]], pagination_info: Dict[str, Any],
-        table_rendering_state: Dict[str, Any]
+        table_rendering_state: Dict[Tuple[Any, ...], Any]
     ) -> None:
         """
         Render a single page following PDF_ENGINE_RULES.md
@@ -1110,7 +1115,7 @@ class PDFEngine:
         self, c: canvas.Canvas, page_num: int, template_config: Dict[str, Any],
         data: Dict[str, Any], page_context: Dict[str, Any],
         content_start_y: float, content_bottom_y: float,
-        pagination_info: Dict[str, Any], table_rendering_state: Dict[str, Any],
+        pagination_info: Dict[str, Any], table_rendering_state: Dict[Tuple[Any, ...], Any],
         bill_content_elements: List[Dict[str, Any]],
         page_height: float = None, section_heights: Dict[str, float] = None
     ) -> float:
@@ -1175,10 +1180,10 @@ class PDFEngine:
             if element.get('type') in ['billContentTable', 'contentDetailTable']:
                 table_config = element.get('config')
                 if element.get('type') == 'billContentTable':
-                    table_key = f"billContentTable_{table_config.get('x', 0)}_{table_config.get('y', 0)}"
+                    table_key = bill_content_table_key(table_config)
                 else:
                     content_name = element.get('content_name')
-                    table_key = f"contentDetailTable_{content_name}_{table_config.get('x', 0)}_{table_config.get('y', 0)}"
+                    table_key = content_detail_table_key(content_name, table_config)
                 
                 if table_key in table_rendering_state:
                     last_index = table_rendering_state[table_key].get('last_index', -1)
@@ -1260,10 +1265,10 @@ class PDFEngine:
             if element.get('type') in ['billContentTable', 'contentDetailTable']:
                 table_config = element.get('config')
                 if element.get('type') == 'billContentTable':
-                    table_key = f"billContentTable_{table_config.get('x', 0)}_{table_config.get('y', 0)}"
+                    table_key = bill_content_table_key(table_config)
                 else:
                     content_name = element.get('content_name')
-                    table_key = f"contentDetailTable_{content_name}_{table_config.get('x', 0)}_{table_config.get('y', 0)}"
+                    table_key = content_detail_table_key(content_name, table_config)
                 
                 if table_key in table_rendering_state:
                     state = table_rendering_state[table_key]
@@ -1373,10 +1378,10 @@ class PDFEngine:
                             # Check if previous table is complete
                             prev_table_config = prev_element['config']
                             if prev_element['type'] == 'billContentTable':
-                                prev_table_key = f"billContentTable_{prev_table_config.get('x', 0)}_{prev_table_config.get('y', 0)}"
+                                prev_table_key = bill_content_table_key(prev_table_config)
                             else:
                                 prev_content_name = prev_element.get('content_name')
-                                prev_table_key = f"contentDetailTable_{prev_content_name}_{prev_table_config.get('x', 0)}_{prev_table_config.get('y', 0)}"
+                                prev_table_key = content_detail_table_key(prev_content_name, prev_table_config)
                             
                             if prev_table_key in table_rendering_state:
                                 if not table_rendering_state[prev_table_key].get('all_rows_rendered', False):
@@ -1519,7 +1524,7 @@ class PDFEngine:
         self, c: canvas.Canvas, element: Dict[str, Any], element_info: Dict[str, Any],
         element_y: float, min_content_y: float, page_num: int,
         page_context: Dict[str, Any], data: Dict[str, Any],
-        template_config: Dict[str, Any], table_rendering_state: Dict[str, Any]
+        template_config: Dict[str, Any], table_rendering_state: Dict[Tuple[Any, ...], Any]
     ) -> float:
         """
         Render a single content element (field or table).
@@ -1570,7 +1575,7 @@ class PDFEngine:
             
             # RULE 5: Multiple Tables Have Independent Final Row States
             # Initialize state if not exists (MANDATORY: independent state per table)
-            table_key = f"billContentTable_{table_config.get('x', 0)}_{table_config.get('y', 0)}"
+            table_key = bill_content_table_key(table_config)
             if table_key not in table_rendering_state:
                 table_rendering_state[table_key] = {
                     'last_index': -1,
@@ -1781,7 +1786,7 @@ class PDFEngine:
             
             # RULE 5 & 6 & 7: ContentDetail Tables Follow Same Rules - Independent State Per Content Name
             # Each content name (e.g., payment, tax, discount) has independent state
-            content_table_key = f"contentDetailTable_{content_name}_{table_config.get('x', 0)}_{table_config.get('y', 0)}"
+            content_table_key = content_detail_table_key(content_name, table_config)
             
             # RULE 1 & 7: total_items Must Equal the Actual Data Length
             # Initialize state if not exists (MANDATORY: independent state per content name)
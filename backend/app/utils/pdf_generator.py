@@ -5,6 +5,7 @@ Refactored version using separate modules for field rendering, table rendering,
 """
 from reportlab.pdfgen import canvas
 from io import BytesIO
+from operator import itemgetter
 from typing import Dict, Any, List
 import json
 import logging
@@ -659,7 +660,7 @@ class PDFGenerator:
                         })
                     
                     # Sort by Y position
-                    all_tables_to_render.sort(key=lambda t: t['y'])
+                    all_tables_to_render.sort(key=itemgetter('y'))
                     
                     # Track current Y position within the content area for flowing content
                     # Start at the highest possible Y (top of content area) minus the first table's configured Y
@@ -11,9 +11,11 @@ Responsibilities:
 - Guarantee minimum one row per page
 """
 
-from typing import Dict, Any
+from typing import Dict, Any, Tuple
 import logging
 
+from .pdf_dynamic_content_engine import bill_content_table_key, content_detail_table_key
+
 logger = logging.getLogger(__name__)
 
 
@@ -168,7 +170,7 @@ class PageBalanceFitEngine:
     
     def validate_page_content(
         self, page_num: int, elements_rendered: int,
-        cursor_state: Dict[str, Any]
+        cursor_state: Dict[Tuple[Any, ...], Any]
     ) -> Dict[str, Any]:
         """
         Validate page content and check for continuation requirements.
@@ -181,7 +183,7 @@ class PageBalanceFitEngine:
         Returns:
             Dictionary with:
             - 'valid': bool - Whether page is valid
-            - 'needs_continuation': List[str] - List of table keys needing continuation
+            - 'needs_continuation': List[Tuple[Any, ...]] - Keys of tables needing continuation (see bill_content_table_key / content_detail_table_key)
             - 'warnings': List[str] - List of warning messages
         """
         needs_continuation = []
@@ -211,7 +213,7 @@ class PageBalanceFitEngine:
         }
     
     def get_tables_needing_continuation(
-        self, bill_content_elements: list, cursor_state: Dict[str, Any], page_num: int
+        self, bill_content_elements: list, cursor_state: Dict[Tuple[Any, ...], Any], page_num: int
     ) -> list:
         """
         Get tables that need continuation on the next page.
@@ -244,10 +246,10 @@ class PageBalanceFitEngine:
                 items = element.get('data', [])
                 
                 if element['type'] == 'billContentTable':
-                    table_key = f"billContentTable_{table_config.get('x', 0)}_{table_config.get('y', 0)}"
+                    table_key = bill_content_table_key(table_config)
                 else:
                     content_name = element.get('content_name')
-                    table_key = f"contentDetailTable_{content_name}_{table_config.get('x', 0)}_{table_config.get('y', 0)}"
+                    table_key = content_detail_table_key(content_name, table_config)
                 
                 if table_key in cursor_state:
                     state = cursor_state[table_key]
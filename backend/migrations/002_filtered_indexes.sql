@@ -0,0 +1,16 @@
+-- Dynamic Bill Preview System - Filtered indexes for active rows
+-- MSSQL Server Migration Script
+
+-- Every service query filters on IsActive = 1 (soft delete). These filtered
+-- indexes only contain active rows so those lookups become narrow seeks.
+
+-- Active templates by preset, newest first (list_templates)
+CREATE INDEX IX_ReportTemplates_PresetId_Active
+    ON ReportTemplates(PresetId, CreatedOn DESC)
+    INCLUDE (TemplateName)
+    WHERE IsActive = 1;
+
+-- Active template name lookups (duplicate check on create, get by name)
+CREATE INDEX IX_ReportTemplates_TemplateName_Active
+    ON ReportTemplates(TemplateName, PresetId)
+    WHERE IsActive = 1;